@@ -12,6 +12,12 @@ ini_set('display_errors', 0);
 ini_set('log_errors', 1);
 
 require_once 'db_init.php';
+require_once 'subnet_index.php';
+require_once 'subnet_trie.php';
+require_once 'subnet_allocator.php';
+require_once 'host_registry.php';
+require_once 'session_store.php';
+require_once 'api_token.php';
 
 // Clear any output that might have been generated
 ob_clean();
@@ -19,14 +25,57 @@ ob_clean();
 header('Content-Type: application/json');
 header('Access-Control-Allow-Origin: *');
 header('Access-Control-Allow-Methods: GET, POST, PUT, DELETE');
-header('Access-Control-Allow-Headers: Content-Type');
+header('Access-Control-Allow-Headers: Content-Type, Authorization');
 
 class SubnetAPI {
+    const MAX_BATCH_IPS = 100000;
+    const MAX_BATCH_BYTES = 4194304; // MAX_BATCH_IPS quoted addresses with separators
+    const MAX_LOAD_MANY = 1000;
+    const MAX_ALLOCATE_COUNT = 1024;
+    const ALLOCATED_DESCRIPTION = 'Allocated';
+    const MAX_PLAN_SEGMENTS = 10000;
+    const DEFAULT_PAGE_SIZE = 50;
+    const NGRAM_TOKEN_SIZE = 2; // MySQL ngram_token_size default
+    const MAX_PAGE_SIZE = 500;
+    const MAX_IMPORT_ROWS = 10000;
+    const IMPORT_BATCH_SIZE = 500;
+    
+    // CSV import header => JSON import field
+    const IMPORT_CSV_COLUMNS = [
+        'site_name' => 'siteName',
+        'admin_number' => 'adminNumber',
+        'network_address' => 'networkAddress',
+        'division_data' => 'divisionData',
+        'vlan_ids' => 'vlanIds',
+        'vlan_names' => 'vlanNames',
+        'subnets' => 'subnets'
+    ];
+    
+    // listConfigurations sort keys: [column, descending], each backed by a (column, id) index
+    const LIST_SORTS = [
+        'updated' => ['updated_at', true],
+        'site' => ['site_name', false],
+        'network' => ['net_start', false],
+        'admin' => ['admin_number', false]
+    ];
+    
+    // Columns clients may request from loadMany
+    const CONFIG_FIELDS = [
+        'id', 'site_name', 'admin_number', 'network_address', 'mask_bits',
+        'division_data', 'vlan_ids', 'vlan_names', 'created_at', 'updated_at'
+    ];
+    
     private $db;
+    private $index;
+    private $trie;
+    private $hosts;
     
     public function __construct() {
         $database = new SubnetDatabase(null, true); // Silent mode, use environment variables
         $this->db = $database->getConnection();
+        $this->index = new SubnetIndex($this->db);
+        $this->trie = new SubnetTrie($this->db);
+        $this->hosts = new HostRegistry($this->db);
     }
     
     public function handleRequest() {
@@ -38,6 +87,18 @@ class SubnetAPI {
                 case 'POST':
                     if ($action === 'save') {
                         return $this->saveConfiguration();
+                    } elseif ($action === 'searchIPs') {
+                        return $this->searchIPsInDatabase();
+                    } elseif ($action === 'loadMany') {
+                        return $this->loadManyConfigurations();
+                    } elseif ($action === 'import') {
+                        return $this->importConfigurations();
+                    } elseif ($action === 'allocate') {
+                        return $this->allocateSubnets();
+                    } elseif ($action === 'plan') {
+                        return $this->planSegments();
+                    } elseif ($action === 'assignHost') {
+                        return $this->assignHost();
                     }
                     break;
                 case 'GET':
@@ -45,13 +106,31 @@ class SubnetAPI {
                         return $this->listConfigurations();
                     } elseif ($action === 'load') {
                         return $this->loadConfiguration();
+                    } elseif ($action === 'loadMany') {
+                        return $this->loadManyConfigurations();
                     } elseif ($action === 'searchIP') {
                         return $this->searchIPInDatabase();
+                    } elseif ($action === 'conflicts') {
+                        return $this->listConflicts();
+                    } elseif ($action === 'export') {
+                        return $this->exportConfigurations();
+                    } elseif ($action === 'vlanUsage') {
+                        return $this->vlanUsage();
+                    } elseif ($action === 'freeVlans') {
+                        return $this->freeVlans();
+                    } elseif ($action === 'stats') {
+                        return $this->utilizationStats();
+                    } elseif ($action === 'hosts') {
+                        return $this->listHosts();
+                    } elseif ($action === 'changes') {
+                        return $this->listChanges();
                     }
                     break;
                 case 'DELETE':
                     if ($action === 'delete') {
                         return $this->deleteConfiguration();
+                    } elseif ($action === 'releaseHost') {
+                        return $this->releaseHost();
                     }
                     break;
             }
@@ -62,20 +141,29 @@ class SubnetAPI {
         }
     }
     
-    private function authenticateUser($username, $password) {
-        if (empty($username) || empty($password)) {
-            return false;
+    /**
+     * Signed API token from the Authorization header, or a logged-in session
+     */
+    private function isAuthenticated() {
+        return $this->authenticatedUser() !== null;
+    }
+    
+    /**
+     * Token subject or session username of the caller, null when anonymous
+     */
+    private function authenticatedUser() {
+        // Automation clients send a bearer token and never touch the session
+        $token = ApiToken::fromRequest();
+        if ($token !== null) {
+            $claims = ApiToken::verify($token);
+            return $claims === null ? null : (string)$claims['sub'];
         }
-        $stmt = $this->db->prepare("SELECT password_hash FROM users WHERE username = ? LIMIT 1");
-        $stmt->execute([$username]);
-        $row = $stmt->fetch(PDO::FETCH_ASSOC);
-        if (!$row) return false;
-        return password_verify($password, $row['password_hash']);
+        SessionStore::start($this->db); // Read-only: saving never holds the session lock
+        return isset($_SESSION['user_id']) ? ($_SESSION['username'] ?? '') : null;
     }
 
     private function saveConfiguration() {
-        session_start();
-        if (!isset($_SESSION['user_id'])) {
+        if (!$this->isAuthenticated()) {
             return $this->sendResponse(false, 'Not authenticated');
         }
         $input = json_decode(file_get_contents('php://input'), true);
@@ -101,6 +189,10 @@ class SubnetAPI {
         $vlanIds = $input['vlanIds'] ?? '';
         $vlanNames = $input['vlanNames'] ?? '';
         
+        if (SubnetTree::decodeDivision($divisionData) === false) {
+            return $this->sendResponse(false, 'Invalid divisionData');
+        }
+        
         // Validate VLAN IDs if provided
         if (!empty($vlanIds)) {
             $vlanValidation = $this->validateVlanIds($vlanIds);
@@ -139,19 +231,8 @@ class SubnetAPI {
                     }
                 }
                 
-                $stmt = $this->db->prepare(
-                    "UPDATE subnet_configurations 
-                     SET division_data = ?, vlan_ids = ?, vlan_names = ?, updated_at = CURRENT_TIMESTAMP 
-                     WHERE id = ?"
-                );
-                $stmt->execute([$divisionData, $vlanIds, $vlanNames, $configId]);
-                
-                if ($stmt->rowCount() > 0) {
-                    $message = 'Configuration updated successfully';
-                    return $this->sendResponse(true, $message, ['id' => $configId]);
-                } else {
-                    return $this->sendResponse(false, 'Configuration not found or no changes made');
-                }
+                // Index rows are built from the stored network, not the submitted one
+                $networkAddress = $currentConfig['network_address'];
             } else {
                 // Check if configuration already exists (for new saves)
                 $stmt = $this->db->prepare(
@@ -162,56 +243,930 @@ class SubnetAPI {
                 $existingConfig = $stmt->fetch();
                 
                 if ($existingConfig) {
-                    // Update existing configuration
+                    $configId = $existingConfig['id'];
+                }
+            }
+            
+            // The configuration row and its lookup index are written together
+            $this->db->beginTransaction();
+            try {
+                if ($configId) {
                     $stmt = $this->db->prepare(
                         "UPDATE subnet_configurations 
                          SET division_data = ?, vlan_ids = ?, vlan_names = ?, updated_at = CURRENT_TIMESTAMP 
                          WHERE id = ?"
                     );
-                    $stmt->execute([$divisionData, $vlanIds, $vlanNames, $existingConfig['id']]);
+                    $stmt->execute([$divisionData, $vlanIds, $vlanNames, $configId]);
+                    
+                    if ($stmt->rowCount() === 0) {
+                        $this->db->rollBack();
+                        return $this->sendResponse(false, 'Configuration not found or no changes made');
+                    }
                     $message = 'Configuration updated successfully';
-                    return $this->sendResponse(true, $message, ['id' => $existingConfig['id']]);
                 } else {
                     // Insert new configuration
+                    list($netStart, $netEnd) = SubnetTree::networkRange($networkAddress);
                     $stmt = $this->db->prepare(
                         "INSERT INTO subnet_configurations 
-                         (site_name, admin_number, network_address, mask_bits, division_data, vlan_ids, vlan_names) 
-                         VALUES (?, ?, ?, ?, ?, ?, ?)"
+                         (site_name, admin_number, network_address, mask_bits, net_start, net_end, division_data, vlan_ids, vlan_names) 
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
                     );
-                    $stmt->execute([$siteName, $adminNumber, $networkAddress, $maskBits, $divisionData, $vlanIds, $vlanNames]);
-                    $newId = $this->db->lastInsertId();
+                    $stmt->execute([$siteName, $adminNumber, $networkAddress, $maskBits, $netStart, $netEnd, $divisionData, $vlanIds, $vlanNames]);
+                    $configId = $this->db->lastInsertId();
                     $message = 'Configuration saved successfully';
-                    return $this->sendResponse(true, $message, ['id' => $newId]);
                 }
+                
+                $this->index->rebuild($configId, $networkAddress, $divisionData, $vlanIds, $vlanNames);
+                $orphans = $this->orphanedHosts([$configId]);
+                if ($orphans) {
+                    $this->db->rollBack();
+                    return $this->sendResponse(false, count($orphans) . ' assigned host(s) would be left without a usable address; release them first', [
+                        'orphanedHosts' => $orphans
+                    ]);
+                }
+                SubnetTrie::bumpVersion($this->db, [$configId]);
+                $this->db->commit();
+            } catch (PDOException $e) {
+                $this->db->rollBack();
+                throw $e;
+            }
+            
+            return $this->sendResponse(true, $message, ['id' => $configId]);
+            
+        } catch (PDOException $e) {
+            return $this->sendResponse(false, 'Database error: ' . $e->getMessage());
+        }
+    }
+    
+    /**
+     * Allocate free blocks of a prefix length from one configuration or from
+     * every configuration of a site
+     *
+     * Expects JSON with configId or siteName, prefixLength, optional count
+     * and an optional vlanId/vlanName for the new blocks (a vlanId only with
+     * a count of 1, one VLAN per subnet). Blocks without
+     * either get the description ALLOCATED_DESCRIPTION so they stay taken.
+     * Leaves with assigned hosts count as taken too.
+     * The configuration rows are locked with SELECT ... FOR UPDATE, so
+     * concurrent allocations wait for each other and never share a block.
+     */
+    private function allocateSubnets() {
+        if (!$this->isAuthenticated()) {
+            return $this->sendResponse(false, 'Not authenticated');
+        }
+        $input = json_decode(file_get_contents('php://input'), true);
+        if (!is_array($input)) {
+            return $this->sendResponse(false, 'Invalid allocation request');
+        }
+        
+        $configId = intval($input['configId'] ?? 0);
+        $siteName = trim((string)($input['siteName'] ?? ''));
+        $mask = intval($input['prefixLength'] ?? 0);
+        $count = intval($input['count'] ?? 1);
+        $vlanId = trim((string)($input['vlanId'] ?? ''));
+        $vlanName = trim((string)($input['vlanName'] ?? ''));
+        
+        if ($configId <= 0 && $siteName === '') {
+            return $this->sendResponse(false, 'Missing required field: configId or siteName');
+        }
+        if ($mask < 1 || $mask > 32) {
+            return $this->sendResponse(false, 'prefixLength must be between 1 and 32');
+        }
+        if ($count < 1 || $count > self::MAX_ALLOCATE_COUNT) {
+            return $this->sendResponse(false, 'count must be between 1 and ' . self::MAX_ALLOCATE_COUNT);
+        }
+        if ($vlanId !== '' && (!ctype_digit($vlanId) || $vlanId < 1 || $vlanId > 4094)) {
+            return $this->sendResponse(false, "Invalid VLAN ID: '$vlanId'. VLAN IDs must be between 1 and 4094.");
+        }
+        if ($vlanId !== '' && $count > 1) {
+            return $this->sendResponse(false, 'vlanId can only be set when allocating a single block');
+        }
+        if ($vlanId === '' && $vlanName === '') {
+            $vlanName = self::ALLOCATED_DESCRIPTION;
+        }
+        
+        try {
+            $this->db->beginTransaction();
+            try {
+                // Lock in id order so site-wide and single allocations never deadlock
+                $stmt = $this->db->prepare(
+                    "SELECT id, site_name, admin_number, network_address, net_start, division_data, vlan_ids, vlan_names
+                     FROM subnet_configurations
+                     WHERE " . ($configId > 0 ? 'id = ?' : 'site_name = ?') . "
+                     ORDER BY id
+                     FOR UPDATE"
+                );
+                $stmt->execute([$configId > 0 ? $configId : $siteName]);
+                $configs = $stmt->fetchAll(PDO::FETCH_ASSOC);
+                if (!$configs) {
+                    $this->db->rollBack();
+                    return $this->sendResponse(false, 'Configuration not found');
+                }
+                usort($configs, function ($a, $b) {
+                    return [(int)$a['net_start'], (int)$a['id']] <=> [(int)$b['net_start'], (int)$b['id']];
+                });
+                
+                $allocations = [];
+                $changed = [];
+                foreach ($configs as $config) {
+                    // Leaves with assigned hosts are never handed out or split
+                    $allocator = new SubnetAllocator($config['network_address'], $config['division_data'], $config['vlan_ids'], $config['vlan_names'],
+                        $this->hosts->occupiedLeaves($config['id']));
+                    while (count($allocations) < $count && ($start = $allocator->allocate($mask)) !== null) {
+                        $subnet = long2ip($start) . '/' . $mask;
+                        if ($vlanId !== '') {
+                            $config['vlan_ids'] .= $subnet . ':' . rawurlencode($vlanId) . ';';
+                        }
+                        if ($vlanName !== '') {
+                            $config['vlan_names'] .= $subnet . ':' . rawurlencode($vlanName) . ';';
+                        }
+                        $allocations[] = [
+                            'configId' => $config['id'],
+                            'siteName' => $config['site_name'],
+                            'adminNumber' => $config['admin_number'],
+                            'networkAddress' => $config['network_address'],
+                            'subnet' => $subnet,
+                            'vlanId' => $vlanId,
+                            'vlanName' => $vlanName
+                        ];
+                        $config['allocated'] = true;
+                    }
+                    if (!empty($config['allocated'])) {
+                        $config['division_data'] = $allocator->divisionData();
+                        if (SubnetTree::decodeDivision($config['division_data']) === false) {
+                            $this->db->rollBack();
+                            return $this->sendResponse(false, "Allocation would split {$config['network_address']} into more than " . SubnetTree::MAX_DIVISION_NODES . ' tree nodes');
+                        }
+                        $changed[] = $config;
+                    }
+                    if (count($allocations) === $count) {
+                        break;
+                    }
+                }
+                
+                if (count($allocations) < $count) {
+                    $this->db->rollBack();
+                    return $this->sendResponse(false, 'Only ' . count($allocations) . " free /$mask block(s) available, $count requested");
+                }
+                
+                $update = $this->db->prepare(
+                    "UPDATE subnet_configurations
+                     SET division_data = ?, vlan_ids = ?, vlan_names = ?, updated_at = CURRENT_TIMESTAMP
+                     WHERE id = ?"
+                );
+                foreach ($changed as $config) {
+                    $update->execute([$config['division_data'], $config['vlan_ids'], $config['vlan_names'], $config['id']]);
+                }
+                $this->index->rebuildMany($changed);
+                $orphans = $this->orphanedHosts(array_column($changed, 'id'));
+                if ($orphans) {
+                    $this->db->rollBack();
+                    return $this->sendResponse(false, count($orphans) . ' assigned host(s) would be left without a usable address; release them first', [
+                        'orphanedHosts' => $orphans
+                    ]);
+                }
+                SubnetTrie::bumpVersion($this->db, array_column($changed, 'id'));
+                $this->db->commit();
+            } catch (PDOException $e) {
+                $this->db->rollBack();
+                throw $e;
+            }
+        } catch (PDOException $e) {
+            return $this->sendResponse(false, 'Database error: ' . $e->getMessage());
+        }
+        
+        return $this->sendResponse(true, "Allocated $count /$mask block(s)", $allocations);
+    }
+    
+    /**
+     * VLSM layout of segments with required host counts, largest first
+     *
+     * Expects JSON with networkAddress and segments [{name, hosts, vlanId}],
+     * optionally with the current divisionData/vlanIds/vlanNames to plan
+     * into their free space. Each segment takes the lowest free block of the
+     * smallest fitting size, which packs power-of-two blocks without gaps.
+     * Nothing is saved: the result is a ready-to-save tree.
+     */
+    private function planSegments() {
+        $input = json_decode(file_get_contents('php://input'), true);
+        $networkAddress = trim((string)($input['networkAddress'] ?? ''));
+        $segments = $input['segments'] ?? null;
+        
+        $range = SubnetTree::networkRange($networkAddress);
+        if ($range === null) {
+            return $this->sendResponse(false, 'Invalid network address format. Expected format: x.x.x.x/x');
+        }
+        if (!is_array($segments) || count($segments) === 0) {
+            return $this->sendResponse(false, 'No segments to plan');
+        }
+        if (count($segments) > self::MAX_PLAN_SEGMENTS) {
+            return $this->sendResponse(false, 'Too many segments (maximum ' . self::MAX_PLAN_SEGMENTS . ')');
+        }
+        
+        $planned = [];
+        foreach (array_values($segments) as $i => $segment) {
+            $hosts = is_array($segment) ? intval($segment['hosts'] ?? 0) : 0;
+            $name = trim((string)($segment['name'] ?? ''));
+            $vlanId = trim((string)($segment['vlanId'] ?? ''));
+            $mask = SubnetTree::prefixForHosts($hosts);
+            if ($hosts < 1 || $mask === null || $mask < $range[2]) {
+                return $this->sendResponse(false, "Segment " . ($i + 1) . ": $hosts host(s) do not fit in $networkAddress");
+            }
+            if ($vlanId !== '' && (!ctype_digit($vlanId) || $vlanId < 1 || $vlanId > 4094)) {
+                return $this->sendResponse(false, "Segment " . ($i + 1) . ": Invalid VLAN ID: '$vlanId'. VLAN IDs must be between 1 and 4094.");
+            }
+            $planned[$i] = [
+                'name' => $name !== '' ? $name : 'Segment ' . ($i + 1),
+                'hosts' => $hosts,
+                'vlanId' => $vlanId,
+                'mask' => $mask
+            ];
+        }
+        
+        // Largest blocks first, input order among equal sizes
+        $order = array_keys($planned);
+        usort($order, function ($a, $b) use ($planned) {
+            return [$planned[$a]['mask'], $a] <=> [$planned[$b]['mask'], $b];
+        });
+        
+        $divisionData = (string)($input['divisionData'] ?? '');
+        if ($divisionData !== '' && SubnetTree::decodeDivision($divisionData) === false) {
+            return $this->sendResponse(false, 'Invalid divisionData');
+        }
+        
+        $vlanIds = (string)($input['vlanIds'] ?? '');
+        $vlanNames = (string)($input['vlanNames'] ?? '');
+        $allocator = new SubnetAllocator($networkAddress, $divisionData, $vlanIds, $vlanNames);
+        foreach ($order as $i) {
+            $segment = $planned[$i];
+            $start = $allocator->allocate($segment['mask']);
+            if ($start === null) {
+                return $this->sendResponse(false, "Not enough free space for segment '{$segment['name']}' (/{$segment['mask']})");
+            }
+            $subnet = long2ip($start) . '/' . $segment['mask'];
+            $vlanNames .= $subnet . ':' . rawurlencode($segment['name']) . ';';
+            if ($segment['vlanId'] !== '') {
+                $vlanIds .= $subnet . ':' . rawurlencode($segment['vlanId']) . ';';
+            }
+            unset($planned[$i]['mask']);
+            $planned[$i]['subnet'] = $subnet;
+        }
+        
+        $divisionData = $allocator->divisionData();
+        if (SubnetTree::decodeDivision($divisionData) === false) {
+            return $this->sendResponse(false, 'Plan would split ' . $networkAddress . ' into more than ' . SubnetTree::MAX_DIVISION_NODES . ' tree nodes');
+        }
+        
+        $count = count($planned);
+        return $this->sendResponse(true, "Planned $count segment(s)", [
+            'networkAddress' => $networkAddress,
+            'divisionData' => $divisionData,
+            'vlanIds' => $vlanIds,
+            'vlanNames' => $vlanNames,
+            'segments' => $planned
+        ]);
+    }
+    
+    /**
+     * Create or update many configurations in one all-or-nothing transaction
+     *
+     * Accepts a JSON array (or {"configurations": [...]}) of objects with
+     * siteName, adminNumber, networkAddress and either divisionData or a
+     * subnets leaf list, plus optional vlanIds/vlanNames; or CSV with the
+     * snake_case column names (format=csv or a text/csv body). Every row is
+     * validated first, overlaps included, and nothing is written if any fails.
+     */
+    private function importConfigurations() {
+        if (!$this->isAuthenticated()) {
+            return $this->sendResponse(false, 'Not authenticated');
+        }
+        
+        $rows = $this->readImportRows();
+        if ($rows === null) {
+            return $this->sendResponse(false, 'Invalid import payload. Expected a JSON array of configurations or CSV with a header row');
+        }
+        if (count($rows) === 0) {
+            return $this->sendResponse(false, 'No configurations to import');
+        }
+        if (count($rows) > self::MAX_IMPORT_ROWS) {
+            return $this->sendResponse(false, 'Too many configurations (maximum ' . self::MAX_IMPORT_ROWS . ')');
+        }
+        
+        $report = [];
+        $configs = [];
+        foreach ($rows as $i => $row) {
+            $config = is_array($row) ? $this->normalizeImportRow($row) : 'Invalid row';
+            if (is_string($config)) {
+                $report[$i] = ['row' => $i + 1, 'status' => 'error', 'message' => $config];
+            } else {
+                $configs[$i] = $config;
+            }
+        }
+        
+        try {
+            $this->checkImportConflicts($configs, $report);
+            
+            $failed = count($report);
+            if ($failed > 0) {
+                ksort($report);
+                return $this->sendResponse(false, "Import rejected: $failed row(s) failed validation, nothing was saved", [
+                    'created' => 0,
+                    'updated' => 0,
+                    'failed' => $failed,
+                    'rows' => array_values($report)
+                ]);
             }
             
+            $this->db->beginTransaction();
+            try {
+                foreach (array_chunk($configs, self::IMPORT_BATCH_SIZE) as $chunk) {
+                    $values = [];
+                    foreach ($chunk as $config) {
+                        array_push($values, $config['siteName'], $config['adminNumber'], $config['networkAddress'], $config['maskBits'],
+                            $config['netStart'], $config['netEnd'], $config['divisionData'], $config['vlanIds'], $config['vlanNames']);
+                    }
+                    $stmt = $this->db->prepare(
+                        "INSERT INTO subnet_configurations 
+                         (site_name, admin_number, network_address, mask_bits, net_start, net_end, division_data, vlan_ids, vlan_names) 
+                         VALUES " . implode(',', array_fill(0, count($chunk), '(?, ?, ?, ?, ?, ?, ?, ?, ?)')) . "
+                         ON DUPLICATE KEY UPDATE division_data = VALUES(division_data), vlan_ids = VALUES(vlan_ids),
+                                                 vlan_names = VALUES(vlan_names), updated_at = CURRENT_TIMESTAMP"
+                    );
+                    $stmt->execute($values);
+                }
+                
+                // Read the ids back through the unique key rather than relying on insert id ranges
+                $ids = [];
+                foreach (array_chunk($configs, self::IMPORT_BATCH_SIZE) as $chunk) {
+                    $values = [];
+                    foreach ($chunk as $config) {
+                        array_push($values, $config['siteName'], $config['adminNumber'], $config['networkAddress']);
+                    }
+                    $stmt = $this->db->prepare(
+                        "SELECT id, site_name, admin_number, network_address FROM subnet_configurations 
+                         WHERE (site_name, admin_number, network_address) IN (" . implode(',', array_fill(0, count($chunk), '(?, ?, ?)')) . ")"
+                    );
+                    $stmt->execute($values);
+                    while ($existing = $stmt->fetch(PDO::FETCH_ASSOC)) {
+                        $ids[$this->importKey($existing['site_name'], $existing['admin_number'], $existing['network_address'])] = (int)$existing['id'];
+                    }
+                }
+                
+                $entries = [];
+                foreach ($configs as $i => $config) {
+                    $id = $ids[$this->importKey($config['siteName'], $config['adminNumber'], $config['networkAddress'])];
+                    $report[$i] = ['row' => $i + 1, 'status' => $config['existingId'] ? 'updated' : 'created', 'id' => $id];
+                    $entries[] = [
+                        'id' => $id,
+                        'network_address' => $config['networkAddress'],
+                        'division_data' => $config['divisionData'],
+                        'vlan_ids' => $config['vlanIds'],
+                        'vlan_names' => $config['vlanNames']
+                    ];
+                }
+                $this->index->rebuildMany($entries);
+                $orphans = $this->orphanedHosts(array_column($entries, 'id'));
+                if ($orphans) {
+                    $this->db->rollBack();
+                    return $this->sendResponse(false, count($orphans) . ' assigned host(s) would be left without a usable address; release them first', [
+                        'orphanedHosts' => $orphans
+                    ]);
+                }
+                SubnetTrie::bumpVersion($this->db, array_column($entries, 'id'));
+                $this->db->commit();
+            } catch (PDOException $e) {
+                $this->db->rollBack();
+                throw $e;
+            }
         } catch (PDOException $e) {
             return $this->sendResponse(false, 'Database error: ' . $e->getMessage());
         }
+        
+        ksort($report);
+        $updated = count(array_filter($configs, function ($config) {
+            return $config['existingId'] !== null;
+        }));
+        $created = count($configs) - $updated;
+        return $this->sendResponse(true, "Imported " . count($configs) . " configuration(s): $created created, $updated updated", [
+            'created' => $created,
+            'updated' => $updated,
+            'failed' => 0,
+            'rows' => array_values($report)
+        ]);
+    }
+    
+    /**
+     * Import rows as associative arrays, or null when the payload cannot be parsed
+     */
+    private function readImportRows() {
+        $body = file_get_contents('php://input');
+        $isCsv = ($_GET['format'] ?? '') === 'csv' || stripos($_SERVER['CONTENT_TYPE'] ?? '', 'csv') !== false;
+        
+        if (!$isCsv) {
+            $input = json_decode($body, true);
+            if (is_array($input) && isset($input['configurations'])) {
+                $input = $input['configurations'];
+            }
+            return is_array($input) && array_is_list($input) ? $input : null;
+        }
+        
+        $handle = fopen('php://temp', 'r+');
+        fwrite($handle, preg_replace('/^\xEF\xBB\xBF/', '', $body));
+        rewind($handle);
+        
+        $header = fgetcsv($handle);
+        if (!$header) {
+            return null;
+        }
+        $fields = [];
+        foreach ($header as $column => $name) {
+            $name = strtolower(trim($name));
+            if (isset(self::IMPORT_CSV_COLUMNS[$name])) {
+                $fields[$column] = self::IMPORT_CSV_COLUMNS[$name];
+            }
+        }
+        
+        $rows = [];
+        while (($line = fgetcsv($handle)) !== false) {
+            if ($line === [null]) {
+                continue; // Blank line
+            }
+            $row = [];
+            foreach ($fields as $column => $field) {
+                $row[$field] = $line[$column] ?? '';
+            }
+            // The CSV leaf list is whitespace or semicolon separated
+            if (isset($row['subnets'])) {
+                if (trim($row['subnets']) === '') {
+                    unset($row['subnets']);
+                } else {
+                    $row['subnets'] = preg_split('/[\s;]+/', trim($row['subnets']));
+                }
+            }
+            $rows[] = $row;
+        }
+        fclose($handle);
+        
+        return $rows;
+    }
+    
+    /**
+     * Validate one import row on its own; returns the normalized row or an error message
+     */
+    private function normalizeImportRow(array $row) {
+        $siteName = trim((string)($row['siteName'] ?? ''));
+        $adminNumber = trim((string)($row['adminNumber'] ?? ''));
+        $networkAddress = trim((string)($row['networkAddress'] ?? ''));
+        foreach (['siteName' => $siteName, 'adminNumber' => $adminNumber, 'networkAddress' => $networkAddress] as $field => $value) {
+            if ($value === '') {
+                return "Missing required field: $field";
+            }
+        }
+        
+        $range = SubnetTree::networkRange($networkAddress);
+        if ($range === null || !$this->validateNetworkAddress($networkAddress, $range[2])) {
+            return 'Invalid network address format. Expected format: x.x.x.x/x';
+        }
+        
+        $vlanIds = (string)($row['vlanIds'] ?? '');
+        $vlanNames = (string)($row['vlanNames'] ?? '');
+        if (isset($row['subnets'])) {
+            $tree = is_array($row['subnets']) ? SubnetTree::fromLeaves($networkAddress, $row['subnets']) : null;
+            if ($tree === null) {
+                return "Subnets must be valid, non-overlapping blocks inside $networkAddress";
+            }
+            $divisionData = $tree['divisionData'];
+            if (SubnetTree::decodeDivision($divisionData) === false) {
+                return 'Too many subnets (maximum ' . SubnetTree::MAX_DIVISION_NODES . ' tree nodes)';
+            }
+            $vlanIds .= $tree['vlanIds'];
+            $vlanNames .= $tree['vlanNames'];
+        } else {
+            $divisionData = trim((string)($row['divisionData'] ?? ''));
+            if ($divisionData === '') {
+                return 'Missing required field: divisionData or subnets';
+            }
+            if (SubnetTree::decodeDivision($divisionData) === false) {
+                return 'Invalid divisionData';
+            }
+        }
+        
+        $vlanValidation = $this->validateVlanIds($vlanIds);
+        if (!$vlanValidation['valid']) {
+            return $vlanValidation['message'];
+        }
+        
+        return [
+            'siteName' => $siteName,
+            'adminNumber' => $adminNumber,
+            'networkAddress' => $networkAddress,
+            'maskBits' => $range[2],
+            'netStart' => $range[0],
+            'netEnd' => $range[1],
+            'divisionData' => $divisionData,
+            'vlanIds' => $vlanIds,
+            'vlanNames' => $vlanNames,
+            'existingId' => null
+        ];
+    }
+    
+    /**
+     * Apply the save-time duplicate and overlap rules to a whole import at once
+     *
+     * Existing networks sharing an address with an import row are fetched in
+     * batches; overlaps are found with one sweep over the import and the
+     * existing networks in scope sorted by (start ASC, end DESC). Rows matching
+     * an existing (site, admin, network) get its id so they update it.
+     */
+    private function checkImportConflicts(array &$configs, array &$report) {
+        $fail = function ($i, $message) use (&$configs, &$report) {
+            $report[$i] = ['row' => $i + 1, 'status' => 'error', 'message' => $message];
+            unset($configs[$i]);
+        };
+        
+        $existingByNetwork = [];
+        foreach (array_chunk(array_unique(array_column($configs, 'networkAddress')), self::IMPORT_BATCH_SIZE) as $networks) {
+            $stmt = $this->db->prepare(
+                "SELECT id, site_name, admin_number, network_address FROM subnet_configurations 
+                 WHERE network_address IN (" . implode(',', array_fill(0, count($networks), '?')) . ")"
+            );
+            $stmt->execute($networks);
+            foreach ($stmt->fetchAll(PDO::FETCH_ASSOC) as $existing) {
+                $existingByNetwork[$existing['network_address']] = $existing;
+            }
+        }
+        
+        // Same rules as validateSubnetConfiguration for the exact network address
+        $claimed = [];
+        foreach ($configs as $i => $config) {
+            $network = $config['networkAddress'];
+            $owner = $existingByNetwork[$network] ?? null;
+            $ownerLabel = 'existing configuration';
+            if (isset($claimed[$network])) {
+                $other = $configs[$claimed[$network]];
+                if ($this->importKey($other['siteName'], $other['adminNumber'], $network) === $this->importKey($config['siteName'], $config['adminNumber'], $network)) {
+                    $fail($i, "Duplicate of row " . ($claimed[$network] + 1));
+                    continue;
+                }
+                $owner = ['site_name' => $other['siteName'], 'admin_number' => $other['adminNumber']];
+                $ownerLabel = 'row ' . ($claimed[$network] + 1);
+            }
+            
+            if ($owner) {
+                if (mb_strtolower($owner['site_name']) !== mb_strtolower($config['siteName'])) {
+                    $fail($i, "Network $network is already assigned to site '{$owner['site_name']}' (Admin: {$owner['admin_number']}, $ownerLabel). A subnet cannot be assigned to multiple sites.");
+                    continue;
+                }
+                if (mb_strtolower($owner['admin_number']) !== mb_strtolower($config['adminNumber'])) {
+                    $fail($i, "Network $network already exists at site '{$config['siteName']}' with admin number '{$owner['admin_number']}' ($ownerLabel). Duplicate configurations are not allowed.");
+                    continue;
+                }
+                $configs[$i]['existingId'] = (int)$owner['id'];
+            }
+            $claimed[$network] = $i;
+        }
+        
+        $allSites = getenv('SUBNET_OVERLAP_SCOPE') === 'global';
+        $blocks = [];
+        foreach ($configs as $i => $config) {
+            $blocks[] = [$config['netStart'], $config['netEnd'], $config['siteName'], $config['networkAddress'], $i];
+        }
+        
+        $sql = "SELECT site_name, network_address, net_start, net_end FROM subnet_configurations";
+        $siteBatches = $allSites ? [[]] : array_chunk(array_values(array_unique(array_column($configs, 'siteName'))), self::IMPORT_BATCH_SIZE);
+        foreach ($siteBatches as $sites) {
+            $stmt = $this->db->prepare($sql . ($sites ? " WHERE site_name IN (" . implode(',', array_fill(0, count($sites), '?')) . ")" : ''));
+            $stmt->execute($sites);
+            while ($existing = $stmt->fetch(PDO::FETCH_ASSOC)) {
+                $blocks[] = [(int)$existing['net_start'], (int)$existing['net_end'], $existing['site_name'], $existing['network_address'], null];
+            }
+        }
+        usort($blocks, function ($a, $b) {
+            return [$a[0], $b[1]] <=> [$b[0], $a[1]];
+        });
+        
+        // CIDR blocks nest or are disjoint: the open blocks all contain the current one
+        $stack = [];
+        foreach ($blocks as $block) {
+            while ($stack && end($stack)[1] < $block[0]) {
+                array_pop($stack);
+            }
+            foreach ($stack as $open) {
+                if ($open[3] === $block[3] || ($open[4] === null && $block[4] === null)) {
+                    continue; // Same network is a duplicate, not an overlap; existing pairs predate the import
+                }
+                if (!$allSites && mb_strtolower($open[2]) !== mb_strtolower($block[2])) {
+                    continue;
+                }
+                $row = $block[4] ?? $open[4];
+                $other = $block[4] === null ? $block : $open;
+                if (isset($report[$row])) {
+                    continue;
+                }
+                $where = mb_strtolower($other[2]) === mb_strtolower($configs[$row]['siteName']) ? 'at the same site' : "at site '{$other[2]}'";
+                $source = $other[4] === null ? 'existing network' : 'network of row ' . ($other[4] + 1);
+                $fail($row, "Network {$configs[$row]['networkAddress']} overlaps with $source {$other[3]} $where. Overlapping subnets are not allowed.");
+            }
+            $stack[] = $block;
+        }
+    }
+    
+    /**
+     * Key of the (site, admin, network) unique index, case-insensitive like its collation
+     */
+    private function importKey($siteName, $adminNumber, $networkAddress) {
+        return mb_strtolower($siteName) . "\0" . mb_strtolower($adminNumber) . "\0" . $networkAddress;
     }
     
     private function listConfigurations() {
         $search = $_GET['search'] ?? '';
+        $limit = min(self::MAX_PAGE_SIZE, max(1, intval($_GET['limit'] ?? self::DEFAULT_PAGE_SIZE)));
+        $sortKey = $_GET['sort'] ?? 'updated';
+        if (!isset(self::LIST_SORTS[$sortKey])) {
+            return $this->sendResponse(false, 'Invalid sort key. Expected one of: ' . implode(', ', array_keys(self::LIST_SORTS)));
+        }
+        list($column, $descending) = self::LIST_SORTS[$sortKey];
         
-        $sql = "SELECT id, site_name, admin_number, network_address, mask_bits, 
-                       created_at, updated_at 
-                FROM subnet_configurations";
-        $params = [];
+        list($where, $params, $textQuery, $textTerms) = $this->buildSearchConditions($search);
         
-        if (!empty($search)) {
-            $sql .= " WHERE site_name LIKE ? OR admin_number LIKE ? OR network_address LIKE ?";
-            $searchParam = "%$search%";
-            $params = [$searchParam, $searchParam, $searchParam];
+        // Total is computed before the cursor condition narrows the set
+        $meta = [];
+        if (!empty($_GET['count'])) {
+            $stmt = $this->db->prepare(
+                "SELECT COUNT(*) FROM subnet_configurations" . ($where ? " WHERE " . implode(' AND ', $where) : '')
+            );
+            $stmt->execute($params);
+            $meta['total'] = (int)$stmt->fetchColumn();
         }
         
-        $sql .= " ORDER BY updated_at DESC LIMIT 50";
+        // Keyset pagination on (sort column, id), or on (score, updated_at, id) for
+        // ranked text searches: no OFFSET scan however deep the page
+        $having = null;
+        if (!empty($_GET['cursor'])) {
+            $cursor = json_decode(base64_decode(strtr($_GET['cursor'], '-_', '+/')), true);
+            if (!is_array($cursor) || count($cursor) !== ($textQuery === null ? 2 : 3)) {
+                return $this->sendResponse(false, 'Invalid cursor');
+            }
+            if ($textQuery === null) {
+                $op = $descending ? '<' : '>';
+                $where[] = "($column, id) $op (?, ?)";
+                array_push($params, $cursor[0], intval($cursor[1]));
+            } else {
+                // The score goes back with full precision so ties compare equal
+                $having = "(score, updated_at, id) < (?, ?, ?)";
+            }
+        }
+        
+        $direction = $descending ? 'DESC' : 'ASC';
+        $select = "id, site_name, admin_number, network_address, mask_bits, net_start, created_at, updated_at";
+        if ($textQuery !== null) {
+            $select .= ", vlan_text, MATCH(site_name, admin_number, vlan_text) AGAINST (? IN BOOLEAN MODE) AS score";
+            array_unshift($params, $textQuery);
+        }
+        $sql = "SELECT $select FROM subnet_configurations";
+        if ($where) {
+            $sql .= " WHERE " . implode(' AND ', $where);
+        }
+        if ($textQuery !== null) {
+            if ($having !== null) {
+                $sql .= " HAVING " . $having;
+                array_push($params, sprintf('%.17g', (float)$cursor[0]), $cursor[1], intval($cursor[2]));
+            }
+            $sql .= " ORDER BY score DESC, updated_at DESC, id DESC";
+        } else {
+            $sql .= " ORDER BY $column $direction, id $direction";
+        }
+        // One extra row tells whether another page exists
+        $sql .= " LIMIT " . ($limit + 1);
         
         $stmt = $this->db->prepare($sql);
         $stmt->execute($params);
         
         $configurations = $stmt->fetchAll(PDO::FETCH_ASSOC);
         
-        return $this->sendResponse(true, 'Configurations retrieved successfully', $configurations);
+        $meta['nextCursor'] = null;
+        if (count($configurations) > $limit) {
+            array_pop($configurations);
+            $last = end($configurations);
+            $position = $textQuery === null
+                ? [$last[$column], $last['id']]
+                : [sprintf('%.17g', (float)$last['score']), $last['updated_at'], $last['id']];
+            $meta['nextCursor'] = rtrim(strtr(base64_encode(json_encode($position)), '+/', '-_'), '=');
+        }
+        foreach ($configurations as &$config) {
+            if ($textTerms) {
+                $config['highlights'] = $this->searchHighlights($config, $textTerms);
+            }
+            if ($textQuery !== null) {
+                $config['score'] = (float)$config['score'];
+            }
+            unset($config['net_start'], $config['vlan_text']);
+        }
+        unset($config);
+        
+        return $this->sendResponse(true, 'Configurations retrieved successfully', $configurations, $meta);
+    }
+    
+    /**
+     * Translate a search string into WHERE conditions
+     *
+     * IP and CIDR terms ("10.20", "10.20.0.0/16", "192.168.1.7") become numeric
+     * range predicates matching networks contained in or containing the block,
+     * "/24" matches the mask length, and text terms use the ngram full-text index.
+     * Returns [where, params, boolean-mode query or null, text terms].
+     */
+    private function buildSearchConditions($search) {
+        $where = [];
+        $params = [];
+        $textTerms = [];
+        
+        foreach (preg_split('/\s+/', trim($search), -1, PREG_SPLIT_NO_EMPTY) as $term) {
+            if (preg_match('/^\/(\d{1,2})$/', $term, $matches)) {
+                $where[] = "mask_bits = ?";
+                $params[] = intval($matches[1]);
+            } elseif (preg_match('/^(\d{1,3}(?:\.\d{1,3}){0,3})(?:\.)?(?:\/(\d{1,2}))?$/', $term, $matches) && (strpos($term, '.') !== false || isset($matches[2]))) {
+                // Missing octets are zero, and the implied mask stops at the last given octet
+                $octets = explode('.', $matches[1]);
+                $mask = isset($matches[2]) ? min(32, intval($matches[2])) : 8 * count($octets);
+                $range = SubnetTree::networkRange(implode('.', array_pad($octets, 4, '0')) . '/' . $mask);
+                if ($range === null) {
+                    $textTerms[] = $term;
+                    continue;
+                }
+                list($start, $end) = $range;
+                $containing = SubnetTree::containingStarts($start, $mask);
+                $where[] = "((net_start >= ? AND net_end <= ?) OR (net_start IN (" . implode(',', array_fill(0, count($containing), '?')) . ") AND net_end >= ?))";
+                array_push($params, $start, $end);
+                array_push($params, ...$containing);
+                $params[] = $end;
+            } else {
+                $textTerms[] = $term;
+            }
+        }
+        
+        $fullTextTerms = [];
+        foreach ($textTerms as $term) {
+            if (mb_strlen($term) < self::NGRAM_TOKEN_SIZE) {
+                // Shorter than an ngram token: fall back to an indexable prefix match
+                $where[] = "(site_name LIKE ? OR admin_number LIKE ?)";
+                $prefix = addcslashes($term, '%_\\') . '%';
+                array_push($params, $prefix, $prefix);
+            } else {
+                $fullTextTerms[] = '+"' . str_replace('"', '', $term) . '"';
+            }
+        }
+        
+        $textQuery = null;
+        if ($fullTextTerms) {
+            $textQuery = implode(' ', $fullTextTerms);
+            $where[] = "MATCH(site_name, admin_number, vlan_text) AGAINST (? IN BOOLEAN MODE)";
+            $params[] = $textQuery;
+        }
+        
+        return [$where, $params, $textQuery, $textTerms];
+    }
+    
+    /**
+     * Character offsets of each text term in the displayed fields, plus matching VLAN names
+     */
+    private function searchHighlights(array $config, array $terms) {
+        $highlights = [];
+        foreach (['site_name', 'admin_number'] as $field) {
+            $ranges = [];
+            foreach ($terms as $term) {
+                $offset = 0;
+                while (($pos = mb_stripos($config[$field], $term, $offset)) !== false) {
+                    $ranges[] = [$pos, mb_strlen($term)];
+                    $offset = $pos + mb_strlen($term);
+                }
+            }
+            if ($ranges) {
+                sort($ranges);
+                $highlights[$field] = $ranges;
+            }
+        }
+        
+        $vlans = [];
+        foreach (explode("\n", $config['vlan_text'] ?? '') as $vlan) {
+            foreach ($terms as $term) {
+                if ($vlan !== '' && mb_stripos($vlan, $term) !== false) {
+                    $vlans[] = $vlan;
+                    break;
+                }
+            }
+        }
+        if ($vlans) {
+            $highlights['vlans'] = array_slice($vlans, 0, 5);
+        }
+        
+        return $highlights;
+    }
+    
+    /**
+     * Configurations created or updated, and IDs deleted, after ?since=
+     *
+     * Without a cursor every configuration is returned and meta reset tells
+     * the client to replace its copy. Updates and deletions are paged
+     * together in (row_version, id) order, limit changes per page; pass meta
+     * cursor back as ?since= while meta hasMore is set, and keep the last
+     * one for the next sync. All reads of a page share one snapshot, and row
+     * versions are handed out in commit order, so writes committing
+     * meanwhile are never skipped.
+     */
+    private function listChanges() {
+        $limit = min(self::MAX_LOAD_MANY, max(1, intval($_GET['limit'] ?? self::MAX_PAGE_SIZE)));
+        
+        // [row_version, id] inside a version, or [row_version, null] once it is complete
+        $version = 0;
+        $afterId = 0;
+        $reset = true;
+        if (!empty($_GET['since'])) {
+            $cursor = json_decode(base64_decode(strtr($_GET['since'], '-_', '+/')), true);
+            if (!is_array($cursor) || count($cursor) !== 2 || !is_int($cursor[0])) {
+                return $this->sendResponse(false, 'Invalid cursor');
+            }
+            $version = $cursor[0];
+            $afterId = $cursor[1] === null ? null : intval($cursor[1]);
+            $reset = false;
+        }
+        
+        $this->db->beginTransaction();
+        try {
+            $current = SubnetTrie::currentVersion($this->db);
+            if ($version > $current) {
+                // Cursor from before the database was recreated
+                $version = 0;
+                $afterId = 0;
+                $reset = true;
+            }
+            
+            // Each stream's first limit + 1 changes hold the first limit + 1 of both together
+            $where = $afterId === null ? 'row_version > ?' : '(row_version, %s) > (?, ?)';
+            $params = $afterId === null ? [$version] : [$version, $afterId];
+            $stmt = $this->db->prepare(
+                "SELECT " . implode(', ', self::CONFIG_FIELDS) . ", row_version
+                 FROM subnet_configurations
+                 WHERE " . sprintf($where, 'id') . "
+                 ORDER BY row_version, id
+                 LIMIT " . ($limit + 1)
+            );
+            $stmt->execute($params);
+            $changes = [];
+            while ($config = $stmt->fetch(PDO::FETCH_ASSOC)) {
+                $changes[] = [(int)$config['row_version'], (int)$config['id'], $config];
+            }
+            
+            // A reset replaces the client's copy, so it needs no deletions
+            if (!$reset) {
+                $stmt = $this->db->prepare(
+                    "SELECT config_id, row_version FROM config_tombstones
+                     WHERE " . sprintf($where, 'config_id') . "
+                     ORDER BY row_version, config_id
+                     LIMIT " . ($limit + 1)
+                );
+                $stmt->execute($params);
+                while ($row = $stmt->fetch(PDO::FETCH_ASSOC)) {
+                    $changes[] = [(int)$row['row_version'], (int)$row['config_id'], null];
+                }
+            }
+            $this->db->commit();
+        } catch (PDOException $e) {
+            $this->db->rollBack();
+            throw $e;
+        }
+        
+        usort($changes, function ($a, $b) {
+            return [$a[0], $a[1]] <=> [$b[0], $b[1]];
+        });
+        $hasMore = count($changes) > $limit;
+        if ($hasMore) {
+            $changes = array_slice($changes, 0, $limit);
+            $last = end($changes);
+            $next = [$last[0], $last[1]];
+        } else {
+            $next = [$current, null];
+        }
+        
+        $configurations = [];
+        $deleted = [];
+        foreach ($changes as list(, $id, $config)) {
+            if ($config === null) {
+                $deleted[] = $id;
+            } else {
+                unset($config['row_version']);
+                $configurations[] = $config;
+            }
+        }
+        
+        $count = count($changes);
+        return $this->sendResponse(true, "$count change(s)", [
+            'configurations' => $configurations,
+            'deleted' => $deleted
+        ], [
+            'cursor' => rtrim(strtr(base64_encode(json_encode($next)), '+/', '-_'), '='),
+            'hasMore' => $hasMore,
+            'reset' => $reset
+        ]);
     }
     
     private function loadConfiguration() {
@@ -235,6 +1190,179 @@ class SubnetAPI {
         return $this->sendResponse(true, 'Configuration loaded successfully', $config);
     }
     
+    /**
+     * Load several configurations with one query
+     * Accepts ids (comma list, or a JSON body {"ids": [...]} on POST) or a site name,
+     * plus an optional comma list of fields to return
+     */
+    private function loadManyConfigurations() {
+        $input = [];
+        if ($_SERVER['REQUEST_METHOD'] === 'POST') {
+            $input = json_decode(file_get_contents('php://input'), true) ?? [];
+        }
+        
+        $ids = $input['ids'] ?? ($_GET['ids'] ?? '');
+        if (!is_array($ids)) {
+            $ids = $ids === '' ? [] : explode(',', $ids);
+        }
+        $ids = array_values(array_unique(array_filter(array_map('intval', $ids))));
+        $site = trim($input['site'] ?? ($_GET['site'] ?? ''));
+        
+        if (empty($ids) && $site === '') {
+            return $this->sendResponse(false, 'Configuration ids or site name is required');
+        }
+        if (count($ids) > self::MAX_LOAD_MANY) {
+            return $this->sendResponse(false, 'Too many configuration ids (maximum ' . self::MAX_LOAD_MANY . ')');
+        }
+        
+        $fields = $input['fields'] ?? ($_GET['fields'] ?? '');
+        if (!is_array($fields)) {
+            $fields = $fields === '' ? [] : explode(',', $fields);
+        }
+        $fields = array_map('trim', $fields);
+        $unknown = array_diff($fields, self::CONFIG_FIELDS);
+        if ($unknown) {
+            return $this->sendResponse(false, 'Unknown field(s): ' . implode(', ', $unknown));
+        }
+        $columns = $fields ? array_unique(array_merge(['id'], $fields)) : self::CONFIG_FIELDS;
+        
+        $sql = "SELECT " . implode(', ', $columns) . " FROM subnet_configurations";
+        if ($ids) {
+            $sql .= " WHERE id IN (" . implode(',', array_fill(0, count($ids), '?')) . ")";
+            $params = $ids;
+        } else {
+            $sql .= " WHERE site_name = ?";
+            $params = [$site];
+        }
+        $sql .= " ORDER BY id";
+        
+        $stmt = $this->db->prepare($sql);
+        $stmt->execute($params);
+        $configurations = $stmt->fetchAll(PDO::FETCH_ASSOC);
+        
+        $count = count($configurations);
+        return $this->sendResponse(true, "Loaded $count configuration(s)", $configurations);
+    }
+    
+    /**
+     * Stream every leaf subnet as CSV with constant memory
+     * Optional filters: site (exact name) and network (CIDR overlapping the parent network)
+     */
+    private function exportConfigurations() {
+        $format = $_GET['format'] ?? 'csv';
+        if ($format !== 'csv') {
+            return $this->sendResponse(false, "Unsupported export format: $format");
+        }
+        
+        $site = trim($_GET['site'] ?? '');
+        $network = trim($_GET['network'] ?? '');
+        
+        $sql = "SELECT site_name, admin_number, network_address, division_data, vlan_ids, vlan_names, created_at, updated_at 
+                FROM subnet_configurations";
+        $where = [];
+        $params = [];
+        
+        if ($site !== '') {
+            $where[] = "site_name = ?";
+            $params[] = $site;
+        }
+        if ($network !== '') {
+            $range = SubnetTree::networkRange($network);
+            if ($range === null) {
+                return $this->sendResponse(false, 'Invalid network filter. Expected format: x.x.x.x/x');
+            }
+            $where[] = "net_start <= ? AND net_end >= ?";
+            $params[] = $range[1];
+            $params[] = $range[0];
+        }
+        if ($where) {
+            $sql .= " WHERE " . implode(' AND ', $where);
+        }
+        $sql .= " ORDER BY site_name, net_start";
+        
+        $prefix = $site !== '' ? 'site_' . preg_replace('/[^A-Za-z0-9_-]+/', '_', $site) : 'all_subnets';
+        $filename = $prefix . '_' . date('Ymd_His') . '.csv';
+        
+        while (ob_get_level() > 0) {
+            ob_end_clean();
+        }
+        header('Content-Type: text/csv; charset=utf-8');
+        header('Content-Disposition: attachment; filename="' . $filename . '"');
+        header('X-Accel-Buffering: no');
+        
+        $out = fopen('php://output', 'w');
+        fwrite($out, "\xEF\xBB\xBF"); // UTF-8 BOM so spreadsheet tools detect the encoding
+        fputcsv($out, [
+            'Site Name', 'Admin Number', 'Parent Network', 'Subnet', 'Netmask',
+            'First IP', 'Last IP', 'Usable First', 'Usable Last', 'Usable Count',
+            'Total Hosts', 'VLAN ID', 'VLAN Name', 'Created At', 'Updated At'
+        ]);
+        
+        // Unbuffered cursor: rows are decoded and written one at a time
+        $this->db->setAttribute(PDO::MYSQL_ATTR_USE_BUFFERED_QUERY, false);
+        try {
+            $stmt = $this->db->prepare($sql);
+            $stmt->execute($params);
+            
+            $lines = 0;
+            while ($config = $stmt->fetch(PDO::FETCH_ASSOC)) {
+                foreach ($this->exportRows($config) as $row) {
+                    fputcsv($out, $row);
+                    if (++$lines % 1000 === 0) {
+                        flush();
+                    }
+                }
+            }
+            $stmt->closeCursor();
+        } finally {
+            $this->db->setAttribute(PDO::MYSQL_ATTR_USE_BUFFERED_QUERY, true);
+        }
+        
+        fclose($out);
+        flush();
+        return null;
+    }
+    
+    /**
+     * CSV rows for the leaf subnets of one configuration
+     */
+    private function exportRows(array $config) {
+        $leaves = SubnetTree::walk($config['network_address'], $config['division_data'], $config['vlan_ids'], $config['vlan_names']);
+        foreach ($leaves as $node) {
+            if (!$node['isLeaf']) {
+                continue;
+            }
+            
+            $mask = $node['mask'];
+            if ($mask >= 31) {
+                // /31 point-to-point links and /32 hosts have no network or broadcast address
+                $usableFirst = $node['start'];
+                $usableLast = $node['end'];
+            } else {
+                $usableFirst = $node['start'] + 1;
+                $usableLast = $node['end'] - 1;
+            }
+            
+            yield [
+                $config['site_name'],
+                $config['admin_number'],
+                $config['network_address'],
+                long2ip($node['start']) . '/' . $mask,
+                long2ip(SubnetTree::maskToLong($mask)),
+                long2ip($node['start']),
+                long2ip($node['end']),
+                long2ip($usableFirst),
+                long2ip($usableLast),
+                $usableLast - $usableFirst + 1,
+                $node['end'] - $node['start'] + 1,
+                $node['vlanId'] ?? '',
+                $node['vlanName'],
+                $config['created_at'],
+                $config['updated_at']
+            ];
+        }
+    }
+    
     private function deleteConfiguration() {
         $input = json_decode(file_get_contents('php://input'), true);
         $id = $input['id'] ?? '';
@@ -243,8 +1371,22 @@ class SubnetAPI {
             return $this->sendResponse(false, 'Configuration ID is required');
         }
         
-        $stmt = $this->db->prepare("DELETE FROM subnet_configurations WHERE id = ?");
-        $result = $stmt->execute([$id]);
+        $this->db->beginTransaction();
+        try {
+            $this->index->remove($id);
+            $stmt = $this->db->prepare("DELETE FROM subnet_configurations WHERE id = ?");
+            $stmt->execute([$id]);
+            $version = SubnetTrie::bumpVersion($this->db);
+            if ($stmt->rowCount() > 0) {
+                // Tells cached copies to drop the configuration on their next action=changes
+                $tombstone = $this->db->prepare("REPLACE INTO config_tombstones (config_id, row_version) VALUES (?, ?)");
+                $tombstone->execute([$id, $version]);
+            }
+            $this->db->commit();
+        } catch (PDOException $e) {
+            $this->db->rollBack();
+            throw $e;
+        }
         
         if ($stmt->rowCount() > 0) {
             return $this->sendResponse(true, 'Configuration deleted successfully');
@@ -285,62 +1427,48 @@ class SubnetAPI {
             }
         }
         
-        // Check for overlapping subnet ranges within the same site
-        $networkParts = explode('/', $networkAddress);
-        $networkIp = $networkParts[0];
-        $maskBits = intval($networkParts[1]);
+        // Check for overlapping subnet ranges with one indexed range query
+        $range = SubnetTree::networkRange($networkAddress);
+        if ($range === null) {
+            return ['valid' => false, 'message' => "Invalid network address {$networkAddress}"];
+        }
+        list($netStart, $netEnd, $maskBits) = $range;
+        
+        // CIDR blocks overlap only by containment: an existing block either starts
+        // inside this one or is one of the blocks containing its start address
+        $containing = SubnetTree::containingStarts($netStart, $maskBits);
+        $query = "SELECT site_name, network_address FROM subnet_configurations 
+                  WHERE net_start <= ? AND net_end >= ? 
+                    AND (net_start >= ? OR net_start IN (" . implode(',', array_fill(0, count($containing), '?')) . "))
+                    AND network_address <> ?";
+        $params = array_merge([$netEnd, $netStart, $netStart], $containing, [$networkAddress]);
         
-        // Get all existing networks for this site (excluding current config if updating)
-        $query = "SELECT network_address FROM subnet_configurations WHERE site_name = ?";
-        $params = [$siteName];
+        $allSites = getenv('SUBNET_OVERLAP_SCOPE') === 'global';
+        if (!$allSites) {
+            $query .= " AND site_name = ?";
+            $params[] = $siteName;
+        }
         
         if ($excludeConfigId) {
             $query .= " AND id != ?";
             $params[] = $excludeConfigId;
         }
         
-        $stmt = $this->db->prepare($query);
+        $stmt = $this->db->prepare($query . " LIMIT 1");
         $stmt->execute($params);
-        $existingNetworks = $stmt->fetchAll(PDO::FETCH_COLUMN);
+        $overlap = $stmt->fetch(PDO::FETCH_ASSOC);
         
-        foreach ($existingNetworks as $existingNetwork) {
-            // Skip exact matches (these are handled by the duplicate check above)
-            if ($existingNetwork === $networkAddress) {
-                continue;
-            }
-            
-            if ($this->networksOverlap($networkAddress, $existingNetwork)) {
-                return [
-                    'valid' => false,
-                    'message' => "Network {$networkAddress} overlaps with existing network {$existingNetwork} at the same site. Overlapping subnets are not allowed."
-                ];
-            }
+        if ($overlap) {
+            $where = $overlap['site_name'] === $siteName ? 'at the same site' : "at site '{$overlap['site_name']}'";
+            return [
+                'valid' => false,
+                'message' => "Network {$networkAddress} overlaps with existing network {$overlap['network_address']} {$where}. Overlapping subnets are not allowed."
+            ];
         }
         
         return ['valid' => true];
     }
     
-    private function networksOverlap($network1, $network2) {
-        // Parse both networks
-        list($ip1, $mask1) = explode('/', $network1);
-        list($ip2, $mask2) = explode('/', $network2);
-        
-        // Convert IPs to long integers
-        $ip1Long = ip2long($ip1);
-        $ip2Long = ip2long($ip2);
-        
-        // Calculate network addresses
-        $network1Long = $ip1Long & (-1 << (32 - intval($mask1)));
-        $network2Long = $ip2Long & (-1 << (32 - intval($mask2)));
-        
-        // Calculate broadcast addresses
-        $broadcast1Long = $network1Long | ((1 << (32 - intval($mask1))) - 1);
-        $broadcast2Long = $network2Long | ((1 << (32 - intval($mask2))) - 1);
-        
-        // Check for overlap
-        return !($broadcast1Long < $network2Long || $broadcast2Long < $network1Long);
-    }
-    
     private function validateNetworkAddress($networkAddress, $maskBits) {
         // Check format x.x.x.x/x
         $pattern = '/^(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3})\/(\d{1,2})$/';
@@ -377,39 +1505,45 @@ class SubnetAPI {
         }
         
         try {
-            // Get all subnet configurations from database
-            $stmt = $this->db->prepare(
-                "SELECT id, site_name, admin_number, network_address, mask_bits, division_data, vlan_ids, vlan_names, created_at 
-                 FROM subnet_configurations 
-                 ORDER BY created_at DESC"
-            );
-            $stmt->execute();
-            $configurations = $stmt->fetchAll(PDO::FETCH_ASSOC);
-            
-            $matches = [];
+            // Cached trie first; the SQL index answers while the trie is being rebuilt
+            $matches = $this->trie->lookup($ip);
             
-            foreach ($configurations as $config) {
-                $subnets = $this->extractSubnetsFromConfig($config);
-                
-                foreach ($subnets as $subnet) {
-                    if ($this->isIPInSubnet($ip, $subnet['network'], $subnet['mask'])) {
-                        $matches[] = [
-                            'configId' => $config['id'],
-                            'siteName' => $config['site_name'],
-                            'adminNumber' => $config['admin_number'],
-                            'networkAddress' => $config['network_address'],
-                            'subnet' => $subnet['network'] . '/' . $subnet['mask'],
-                            'vlanName' => $subnet['vlanName'] ?? '',
-                            'createdAt' => $config['created_at']
-                        ];
-                    }
+            if ($matches === null) {
+                $matches = [];
+                foreach ($this->index->lookup($ip) as $entry) {
+                    $matches[] = [
+                        'configId' => $entry['id'],
+                        'siteName' => $entry['site_name'],
+                        'adminNumber' => $entry['admin_number'],
+                        'networkAddress' => $entry['network_address'],
+                        'subnet' => long2ip($entry['start_ip']) . '/' . $entry['mask'],
+                        'vlanId' => $entry['vlan_id'] ?? '',
+                        'vlanName' => $entry['vlan_name'] ?? '',
+                        'isLeaf' => (bool)$entry['is_leaf'],
+                        'createdAt' => $entry['created_at']
+                    ];
                 }
             }
             
+            if (!empty($_GET['leafOnly'])) {
+                $matches = array_values(array_filter($matches, function ($match) {
+                    return $match['isLeaf'];
+                }));
+            }
+            
             if (empty($matches)) {
                 return $this->sendResponse(true, 'IP address not found in any saved subnet configurations', []);
             }
             
+            // Leaf matches carry the host assigned to the address, if any
+            $hosts = $this->hosts->find(ip2long($ip));
+            foreach ($matches as &$match) {
+                if ($match['isLeaf'] && isset($hosts[$match['configId']])) {
+                    $match['host'] = $this->formatHost($hosts[$match['configId']]);
+                }
+            }
+            unset($match);
+            
             $count = count($matches);
             return $this->sendResponse(true, "Found $count matching subnet(s) for IP $ip", $matches);
             
@@ -418,154 +1552,527 @@ class SubnetAPI {
         }
     }
     
-    private function validateIP($ip) {
-        $pattern = '/^(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3})$/';
-        if (!preg_match($pattern, $ip, $matches)) {
-            return false;
+    /**
+     * Resolve a batch of IP addresses in one request
+     * Accepts a JSON array (or {"ips": [...]}) or a newline-delimited body and
+     * streams one NDJSON line per distinct address
+     */
+    private function searchIPsInDatabase() {
+        // The body is bounded before decoding so a huge request is refused up front
+        $body = file_get_contents('php://input', false, null, 0, self::MAX_BATCH_BYTES + 1);
+        if (strlen($body) > self::MAX_BATCH_BYTES) {
+            return $this->sendResponse(false, 'Request body too large (maximum ' . self::MAX_BATCH_BYTES . ' bytes)');
         }
-        
-        // Validate each octet (0-255)
-        for ($i = 1; $i <= 4; $i++) {
-            $octet = intval($matches[$i]);
-            if ($octet < 0 || $octet > 255) {
-                return false;
+        $input = json_decode($body, true);
+        if (is_array($input)) {
+            $addresses = $input['ips'] ?? $input;
+            if (!is_array($addresses)) {
+                return $this->sendResponse(false, 'ips must be an array of IP addresses');
             }
+        } else {
+            $addresses = preg_split('/\r?\n/', $body);
         }
+        unset($body, $input);
         
-        return true;
-    }
-    
-    private function extractSubnetsFromConfig($config) {
-        $subnets = [];
-        $divisionData = $config['division_data'];
-        $vlanNames = json_decode($config['vlan_names'], true) ?? [];
+        $ips = [];
+        $invalid = [];
+        foreach ($addresses as $address) {
+            $address = trim((string)$address);
+            if ($address === '') {
+                continue;
+            }
+            if ($this->validateIP($address)) {
+                $ips[ip2long($address)] = true;
+            } else {
+                $invalid[$address] = true;
+            }
+            if (count($ips) + count($invalid) > self::MAX_BATCH_IPS) {
+                return $this->sendResponse(false, 'Too many IP addresses (maximum ' . self::MAX_BATCH_IPS . ')');
+            }
+        }
+        unset($addresses);
         
-        // Parse the network address to get base network and mask
-        $networkParts = explode('/', $config['network_address']);
-        if (count($networkParts) !== 2) {
-            return $subnets;
+        if (empty($ips) && empty($invalid)) {
+            return $this->sendResponse(false, 'At least one IP address is required');
         }
         
-        $baseNetwork = $networkParts[0];
-        $baseMask = intval($networkParts[1]);
+        $ips = array_keys($ips);
+        sort($ips, SORT_NUMERIC);
         
-        // If division data is just "1.0" or empty/no subdivisions, return base network
-        if ($divisionData === '1.0' || !$divisionData || $divisionData === '[]' || empty(trim($divisionData))) {
-            // Just return the base network
-            $subnets[] = [
-                'network' => $baseNetwork,
-                'mask' => $baseMask,
-                'vlanName' => $vlanNames[$baseNetwork . '/' . $baseMask] ?? ''
-            ];
-            return $subnets;
+        // Stream the results instead of building one JSON document
+        while (ob_get_level() > 0) {
+            ob_end_clean();
         }
+        header('Content-Type: application/x-ndjson');
+        header('X-Accel-Buffering: no');
         
-        // Decode the division data from the encoded format
-        $binaryString = $this->asciiToBin($divisionData);
-        if (!$binaryString) {
-            // If can't decode, return base network
-            $subnets[] = [
-                'network' => $baseNetwork,
-                'mask' => $baseMask,
-                'vlanName' => $vlanNames[$baseNetwork . '/' . $baseMask] ?? ''
-            ];
-            return $subnets;
+        foreach (array_keys($invalid) as $address) {
+            echo json_encode(['ip' => $address, 'error' => 'Invalid IP address format']) . "\n";
         }
         
-        // Parse binary string into subnet tree structure
-        $rootNode = [];
-        $position = 0;
-        $this->parseNodeFromBinary($rootNode, $binaryString, $position);
-        
-        // Extract all subnets from the tree
-        $this->extractSubnetsFromNode($rootNode, $baseNetwork, $baseMask, $subnets, $vlanNames);
+        // Only the configurations the merge pass hits are loaded, once each
+        $configs = [];
+        $lines = 0;
+        foreach ($this->index->lookupMany($ips) as $ipLong => $entries) {
+            $missing = [];
+            foreach ($entries as $entry) {
+                if (!array_key_exists($entry['config_id'], $configs)) {
+                    $missing[$entry['config_id']] = null;
+                }
+            }
+            if ($missing) {
+                $placeholders = implode(',', array_fill(0, count($missing), '?'));
+                $stmt = $this->db->prepare(
+                    "SELECT id, site_name, admin_number, network_address FROM subnet_configurations WHERE id IN ($placeholders)"
+                );
+                $stmt->execute(array_keys($missing));
+                foreach ($stmt->fetchAll(PDO::FETCH_ASSOC) as $config) {
+                    $missing[$config['id']] = $config;
+                }
+                $configs = $missing + $configs;
+            }
+            
+            $matches = [];
+            foreach ($entries as $entry) {
+                $config = $configs[$entry['config_id']];
+                if (!$config) {
+                    continue;
+                }
+                $matches[] = [
+                    'configId' => $config['id'],
+                    'siteName' => $config['site_name'],
+                    'adminNumber' => $config['admin_number'],
+                    'networkAddress' => $config['network_address'],
+                    'subnet' => long2ip($entry['start_ip']) . '/' . $entry['mask'],
+                    'vlanId' => $entry['vlan_id'] ?? '',
+                    'vlanName' => $entry['vlan_name'] ?? '',
+                    'isLeaf' => (bool)$entry['is_leaf']
+                ];
+            }
+            echo json_encode(['ip' => long2ip($ipLong), 'matches' => $matches]) . "\n";
+            
+            if (++$lines % 1000 === 0) {
+                flush();
+            }
+        }
+        flush();
         
-        return $subnets;
+        return null;
     }
     
-    private function asciiToBin($str) {
-        if (preg_match('/([0-9]+)\.([0-9a-f]+)/', $str, $matches)) {
-            $len = intval($matches[1]);
-            $encoded = $matches[2];
-            $out = '';
+    /**
+     * One page of address-space conflicts in sweep order, optionally only
+     * those involving ?site=, with the page's pairs counted by site and VLAN
+     * of the containing block
+     *
+     * Pages resume from meta nextCursor (?cursor=), so each one sweeps only
+     * the blocks it covers; nextCursor is null after the last page.
+     */
+    private function listConflicts() {
+        $site = $_GET['site'] ?? '';
+        $pageSize = min(1000, max(1, intval($_GET['pageSize'] ?? 100)));
+        
+        $cursor = null;
+        if (!empty($_GET['cursor'])) {
+            $cursor = json_decode(base64_decode(strtr($_GET['cursor'], '-_', '+/')), true);
+            if (!is_array($cursor) || count($cursor) !== 5 || !isset(SubnetIndex::CONFLICT_SOURCES[$cursor[0]])
+                || !is_int($cursor[1]) || !is_int($cursor[2]) || !is_int($cursor[3]) || !is_int($cursor[4])) {
+                return $this->sendResponse(false, 'Invalid cursor');
+            }
+        }
+        
+        $conflicts = [];
+        $groups = [];
+        $nextCursor = null;
+        foreach ($this->index->findConflicts($cursor) as $position => $conflict) {
+            if ($site !== '' && $conflict['outer']['siteName'] !== $site && $conflict['inner']['siteName'] !== $site) {
+                continue;
+            }
+            $conflicts[] = $conflict;
             
-            for ($i = 0; $i < $len; $i++) {
-                $hexIndex = intval($i / 4);
-                if ($hexIndex < strlen($encoded)) {
-                    $ch = hexdec($encoded[$hexIndex]);
-                    $pos = $i % 4;
-                    $out .= (($ch & (1 << $pos)) ? '1' : '0');
-                }
+            $key = $conflict['outer']['siteName'] . "\0" . $conflict['outer']['vlanId'] . "\0" . $conflict['outer']['vlanName'];
+            if (!isset($groups[$key])) {
+                $groups[$key] = [
+                    'siteName' => $conflict['outer']['siteName'],
+                    'vlanId' => $conflict['outer']['vlanId'],
+                    'vlanName' => $conflict['outer']['vlanName'],
+                    'count' => 0
+                ];
             }
+            $groups[$key]['count']++;
             
-            return $out;
+            if (count($conflicts) === $pageSize) {
+                $nextCursor = rtrim(strtr(base64_encode(json_encode($position)), '+/', '-_'), '=');
+                break;
+            }
+        }
+        ksort($groups);
+        
+        $count = count($conflicts);
+        return $this->sendResponse(true, "Found $count overlapping pair(s)", [
+            'pageSize' => $pageSize,
+            'groups' => array_values($groups),
+            'conflicts' => $conflicts
+        ], ['nextCursor' => $nextCursor]);
+    }
+    
+    /**
+     * Every subnet using a VLAN, by ?vlanId= or exact ?vlanName=
+     */
+    private function vlanUsage() {
+        $vlanId = $_GET['vlanId'] ?? '';
+        $vlanName = $_GET['vlanName'] ?? '';
+        if ($vlanId === '' && $vlanName === '') {
+            return $this->sendResponse(false, 'vlanId or vlanName parameter is required');
+        }
+        if ($vlanId !== '' && (!ctype_digit($vlanId) || $vlanId < 1 || $vlanId > 4094)) {
+            return $this->sendResponse(false, "Invalid VLAN ID: '$vlanId'. VLAN IDs must be between 1 and 4094.");
+        }
+        
+        $rows = $this->index->vlanUsage($vlanId !== '' ? intval($vlanId) : null, $vlanName !== '' ? $vlanName : null);
+        $usage = [];
+        foreach ($rows as $row) {
+            $usage[] = [
+                'configId' => $row['id'],
+                'siteName' => $row['site_name'],
+                'adminNumber' => $row['admin_number'],
+                'networkAddress' => $row['network_address'],
+                'subnet' => long2ip($row['start_ip']) . '/' . $row['mask'],
+                'vlanId' => $row['vlan_id'] ?? '',
+                'vlanName' => $row['vlan_name'] ?? ''
+            ];
         }
         
-        return false;
+        $count = count($usage);
+        return $this->sendResponse(true, "Found $count subnet(s) using this VLAN", $usage);
     }
     
-    private function parseNodeFromBinary(&$node, $binaryString, &$position) {
-        if ($position >= strlen($binaryString)) {
-            return;
+    /**
+     * VLAN IDs not assigned to any subnet of ?site=, as [first, last] ranges
+     */
+    private function freeVlans() {
+        $site = trim($_GET['site'] ?? '');
+        if ($site === '') {
+            return $this->sendResponse(false, 'site parameter is required');
+        }
+        
+        $ranges = $this->index->freeVlanRanges($site);
+        $free = 0;
+        foreach ($ranges as $range) {
+            $free += $range[1] - $range[0] + 1;
         }
+        return $this->sendResponse(true, "$free VLAN ID(s) free at site $site", [
+            'site' => $site,
+            'free' => $free,
+            'used' => 4094 - $free,
+            'ranges' => $ranges
+        ]);
+    }
+    
+    /**
+     * Per-site utilization rollups from the stored statistics columns; with
+     * ?site= the site's networks are listed as well
+     */
+    private function utilizationStats() {
+        $site = trim($_GET['site'] ?? '');
+        $where = $site !== '' ? 'WHERE site_name = ?' : '';
+        $params = $site !== '' ? [$site] : [];
         
-        $bit = $binaryString[$position];
-        $position++;
+        $stmt = $this->db->prepare(
+            "SELECT site_name,
+                    COUNT(*) AS networks,
+                    SUM(net_end - net_start + 1) AS total_addresses,
+                    SUM(leaf_count) AS leaves,
+                    SUM(allocated_leaves) AS allocated_leaves,
+                    SUM(allocated_addresses) AS allocated_addresses,
+                    SUM(free_addresses) AS free_addresses,
+                    MIN(largest_free_mask) AS largest_free_mask,
+                    SUM(leaf_count IS NULL) AS pending
+             FROM subnet_configurations
+             $where
+             GROUP BY site_name
+             ORDER BY site_name"
+        );
+        $stmt->execute($params);
+        $sites = array_map([$this, 'formatStats'], $stmt->fetchAll(PDO::FETCH_ASSOC));
         
-        if ($bit === '1') {
-            // Node has children
-            $node[2] = [[], []];
-            $this->parseNodeFromBinary($node[2][0], $binaryString, $position);
-            $this->parseNodeFromBinary($node[2][1], $binaryString, $position);
+        $data = ['sites' => $sites];
+        if ($site !== '') {
+            $stmt = $this->db->prepare(
+                "SELECT id, site_name, admin_number, network_address,
+                        net_end - net_start + 1 AS total_addresses,
+                        leaf_count AS leaves, allocated_leaves, allocated_addresses,
+                        free_addresses, largest_free_mask, leaf_count IS NULL AS pending
+                 FROM subnet_configurations
+                 WHERE site_name = ?
+                 ORDER BY net_start, id"
+            );
+            $stmt->execute([$site]);
+            $data['networks'] = array_map([$this, 'formatStats'], $stmt->fetchAll(PDO::FETCH_ASSOC));
         }
-        // If bit is '0', it's a leaf node (no children)
+        
+        $count = count($sites);
+        return $this->sendResponse(true, "Statistics for $count site(s)", $data);
     }
     
-    private function extractSubnetsFromNode($node, $network, $mask, &$subnets, $vlanNames) {
-        // Add current subnet
-        $subnetKey = $network . '/' . $mask;
-        $subnets[] = [
-            'network' => $network,
-            'mask' => $mask,
-            'vlanName' => $vlanNames[$subnetKey] ?? ''
+    private function formatStats(array $row) {
+        $total = (int)$row['total_addresses'];
+        $allocated = (int)$row['allocated_addresses'];
+        $stats = [
+            'siteName' => $row['site_name'],
+            'totalAddresses' => $total,
+            'leaves' => (int)$row['leaves'],
+            'allocatedLeaves' => (int)$row['allocated_leaves'],
+            'allocatedAddresses' => $allocated,
+            'freeAddresses' => (int)$row['free_addresses'],
+            'largestFreeBlock' => $row['largest_free_mask'] !== null ? '/' . $row['largest_free_mask'] : null,
+            'utilization' => $total > 0 ? round(100 * $allocated / $total, 2) : 0,
+            'pending' => (int)$row['pending']  // not yet counted, see rebuild_subnet_index.php
         ];
+        if (isset($row['id'])) {
+            $stats = [
+                'configId' => $row['id'],
+                'adminNumber' => $row['admin_number'],
+                'networkAddress' => $row['network_address']
+            ] + $stats;
+        } else {
+            $stats['networks'] = (int)$row['networks'];
+        }
+        return $stats;
+    }
+    
+    /**
+     * Hosts assigned in one leaf subnet of ?configId= (?subnet=, or the leaf
+     * containing ?ip=) with its utilization and next free address
+     *
+     * Hosts are listed in address order; meta nextAfter is the ?after=
+     * address of the next page.
+     */
+    private function listHosts() {
+        $configId = intval($_GET['configId'] ?? 0);
+        $limit = min(self::MAX_PAGE_SIZE, max(1, intval($_GET['limit'] ?? self::DEFAULT_PAGE_SIZE)));
+        $after = $_GET['after'] ?? '';
+        if ($after !== '' && !$this->validateIP($after)) {
+            return $this->sendResponse(false, 'Invalid after address');
+        }
         
-        // If node has children, process them
-        if (isset($node[2]) && is_array($node[2]) && count($node[2]) >= 2) {
-            $childMask = $mask + 1;
-            
-            // Left child (first half)
-            $leftNetwork = $network;
-            $this->extractSubnetsFromNode($node[2][0], $leftNetwork, $childMask, $subnets, $vlanNames);
-            
-            // Right child (second half)
-            $rightNetwork = $this->calculateSubnetAddress($network, $mask, 1);
-            $this->extractSubnetsFromNode($node[2][1], $rightNetwork, $childMask, $subnets, $vlanNames);
+        $leaf = $this->hostLeaf($configId, $_GET['subnet'] ?? '', $_GET['ip'] ?? '');
+        if (is_string($leaf)) {
+            return $this->sendResponse(false, $leaf);
+        }
+        list($start, $mask) = $leaf;
+        
+        $usage = $this->hosts->usage($configId, $start, $mask);
+        $rows = $this->hosts->hosts($configId, $start, $start + (1 << (32 - $mask)) - 1, $after !== '' ? ip2long($after) : null, $limit + 1);
+        $meta = ['nextAfter' => null];
+        if (count($rows) > $limit) {
+            array_pop($rows);
+            $meta['nextAfter'] = long2ip(end($rows)['ip']);
+        }
+        
+        $subnet = long2ip($start) . '/' . $mask;
+        return $this->sendResponse(true, "{$usage['assigned']} of {$usage['usable']} address(es) assigned in $subnet", [
+            'configId' => $configId,
+            'subnet' => $subnet,
+            'assigned' => $usage['assigned'],
+            'usable' => $usage['usable'],
+            'utilization' => $usage['usable'] > 0 ? round(100 * $usage['assigned'] / $usage['usable'], 2) : 0,
+            'nextFree' => $usage['nextFree'] === null ? null : long2ip($usage['nextFree']),
+            'hosts' => array_map([$this, 'formatHost'], $rows)
+        ], $meta);
+    }
+    
+    /**
+     * Assign an address to a host
+     *
+     * Expects JSON with configId, hostname, optional mac and either ip or
+     * the leaf subnet to take the next free address from. The leaf's
+     * bitset row is locked for the transaction, so concurrent assignments
+     * in one subnet never hand out the same address.
+     */
+    private function assignHost() {
+        $user = $this->authenticatedUser();
+        if ($user === null) {
+            return $this->sendResponse(false, 'Not authenticated');
+        }
+        $input = json_decode(file_get_contents('php://input'), true);
+        if (!is_array($input)) {
+            return $this->sendResponse(false, 'Invalid host assignment');
         }
+        
+        $configId = intval($input['configId'] ?? 0);
+        $ip = trim((string)($input['ip'] ?? ''));
+        $hostname = trim((string)($input['hostname'] ?? ''));
+        $mac = trim((string)($input['mac'] ?? ''));
+        
+        if ($hostname === '' || mb_strlen($hostname) > 255) {
+            return $this->sendResponse(false, 'hostname is required and must be at most 255 characters');
+        }
+        if ($mac !== '') {
+            if (!preg_match('/^[0-9a-f]{2}([:.-]?)[0-9a-f]{2}(\1[0-9a-f]{2}){4}$/i', $mac)) {
+                return $this->sendResponse(false, "Invalid MAC address: '$mac'");
+            }
+            $mac = strtolower(implode(':', str_split(preg_replace('/[^0-9a-f]/i', '', $mac), 2)));
+        }
+        if ($ip !== '' && !$this->validateIP($ip)) {
+            return $this->sendResponse(false, 'Invalid IP address format');
+        }
+        
+        $leaf = $this->hostLeaf($configId, $ip === '' ? (string)($input['subnet'] ?? '') : '', $ip);
+        if (is_string($leaf)) {
+            return $this->sendResponse(false, $leaf);
+        }
+        list($start, $mask) = $leaf;
+        $subnet = long2ip($start) . '/' . $mask;
+        
+        try {
+            $this->db->beginTransaction();
+            try {
+                $bitmap = $this->hosts->lockBitmap($configId, $start, $mask);
+                if ($ip === '') {
+                    $offset = HostRegistry::nextFree($bitmap);
+                    if ($offset === null) {
+                        $this->db->rollBack();
+                        return $this->sendResponse(false, "No free address left in $subnet");
+                    }
+                    $ipLong = $start + $offset;
+                } else {
+                    $ipLong = ip2long($ip);
+                    $offset = $ipLong - $start;
+                    if (HostRegistry::isSet($bitmap, $offset)) {
+                        $this->db->rollBack();
+                        return $this->sendResponse(false, HostRegistry::isReserved($mask, $offset)
+                            ? "$ip is the network or broadcast address of $subnet"
+                            : "$ip is already assigned");
+                    }
+                }
+                $this->hosts->assign($configId, $start, $mask, $bitmap, $ipLong, $hostname, $mac !== '' ? $mac : null, $user);
+                $this->db->commit();
+            } catch (PDOException $e) {
+                $this->db->rollBack();
+                throw $e;
+            }
+        } catch (PDOException $e) {
+            return $this->sendResponse(false, 'Database error: ' . $e->getMessage());
+        }
+        
+        $hosts = $this->hosts->find($ipLong);
+        return $this->sendResponse(true, 'Assigned ' . long2ip($ipLong) . " to $hostname", $this->formatHost($hosts[$configId]));
     }
     
-    private function calculateSubnetAddress($networkAddress, $mask, $subnetIndex) {
-        // Convert IP to long
-        $networkLong = ip2long($networkAddress);
+    /**
+     * Release the address ip of configuration configId (JSON body)
+     */
+    private function releaseHost() {
+        if (!$this->isAuthenticated()) {
+            return $this->sendResponse(false, 'Not authenticated');
+        }
+        $input = json_decode(file_get_contents('php://input'), true);
+        $configId = intval($input['configId'] ?? 0);
+        $ip = trim((string)($input['ip'] ?? ''));
+        if ($ip === '' || !$this->validateIP($ip)) {
+            return $this->sendResponse(false, 'Valid ip is required');
+        }
         
-        // Calculate subnet size
-        $subnetSize = 1 << (32 - ($mask + 1));
+        $leaf = $this->hostLeaf($configId, '', $ip);
+        if (is_string($leaf)) {
+            return $this->sendResponse(false, $leaf);
+        }
+        list($start, $mask) = $leaf;
+        
+        $this->db->beginTransaction();
+        try {
+            $bitmap = $this->hosts->lockBitmap($configId, $start, $mask);
+            $released = $this->hosts->release($configId, $start, $mask, $bitmap, ip2long($ip));
+            $this->db->commit();
+        } catch (PDOException $e) {
+            $this->db->rollBack();
+            throw $e;
+        }
+        
+        if ($released) {
+            return $this->sendResponse(true, "Released $ip");
+        } else {
+            return $this->sendResponse(false, "$ip is not assigned");
+        }
+    }
+    
+    /**
+     * Leaf subnet [start, mask] for host operations, from a subnet that
+     * must itself be a leaf or from an address inside one; an error
+     * message when there is none
+     */
+    private function hostLeaf($configId, $subnet, $ip) {
+        if ($configId <= 0) {
+            return 'configId is required';
+        }
         
-        // Calculate new subnet address
-        $newNetworkLong = $networkLong + ($subnetIndex * $subnetSize);
+        if ($subnet !== '') {
+            $parts = explode('/', $subnet);
+            if (count($parts) !== 2 || !$this->validateIP($parts[0]) || !ctype_digit($parts[1]) || $parts[1] > 32) {
+                return "Invalid subnet: '$subnet'";
+            }
+            $mask = intval($parts[1]);
+            $start = ip2long($parts[0]) & SubnetTree::maskToLong($mask);
+            $leaf = $this->hosts->leafFor($configId, $start);
+            if ($leaf !== [$start, $mask]) {
+                return "$subnet is not a leaf subnet of configuration $configId";
+            }
+        } elseif ($ip !== '') {
+            if (!$this->validateIP($ip)) {
+                return 'Invalid IP address format';
+            }
+            $leaf = $this->hosts->leafFor($configId, ip2long($ip));
+            if ($leaf === null) {
+                return "$ip is not in configuration $configId";
+            }
+        } else {
+            return 'subnet or ip parameter is required';
+        }
         
-        return long2ip($newNetworkLong);
+        if ($leaf[1] < HostRegistry::MIN_MASK) {
+            return 'Hosts are tracked in subnets of /' . HostRegistry::MIN_MASK . ' or smaller; divide ' . long2ip($leaf[0]) . '/' . $leaf[1] . ' first';
+        }
+        return $leaf;
+    }
+    
+    /**
+     * Hosts the entries just rebuilt for $configIds leave without a usable
+     * address, with their configuration; the caller rolls back if any
+     */
+    private function orphanedHosts(array $configIds) {
+        $orphans = [];
+        foreach ($this->hosts->orphans($configIds) as $row) {
+            $orphans[] = ['configId' => (int)$row['config_id']] + $this->formatHost($row);
+        }
+        return $orphans;
     }
     
-    private function isIPInSubnet($ip, $networkIP, $maskBits) {
-        $ipLong = ip2long($ip);
-        $networkLong = ip2long($networkIP);
-        $subnetMask = (-1 << (32 - $maskBits)) & 0xFFFFFFFF;
+    private function formatHost(array $row) {
+        return [
+            'ip' => long2ip($row['ip']),
+            'hostname' => $row['hostname'],
+            'mac' => $row['mac'] ?? '',
+            'assignedBy' => $row['assigned_by'] ?? '',
+            'assignedAt' => $row['assigned_at']
+        ];
+    }
+    
+    private function validateIP($ip) {
+        $pattern = '/^(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3})$/';
+        if (!preg_match($pattern, $ip, $matches)) {
+            return false;
+        }
         
-        $networkAddress = $networkLong & $subnetMask;
-        $broadcastAddress = $networkAddress | (~$subnetMask & 0xFFFFFFFF);
+        // Validate each octet (0-255)
+        for ($i = 1; $i <= 4; $i++) {
+            $octet = intval($matches[$i]);
+            if ($octet < 0 || $octet > 255) {
+                return false;
+            }
+        }
         
-        return $ipLong >= $networkAddress && $ipLong <= $broadcastAddress;
+        return true;
     }
     
     private function validateVlanIds($vlanIds) {
@@ -613,7 +2120,7 @@ class SubnetAPI {
         return ['valid' => true];
     }
     
-    private function sendResponse($success, $message, $data = null) {
+    private function sendResponse($success, $message, $data = null, array $meta = []) {
         $response = [
             'success' => $success,
             'message' => $message
@@ -623,6 +2130,9 @@ class SubnetAPI {
             $response['data'] = $data;
         }
         
+        // Extra top-level fields such as pagination cursors
+        $response += $meta;
+        
         echo json_encode($response);
         return $response;
     }
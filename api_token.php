@@ -0,0 +1,87 @@
+<?php
+/**
+ * Stateless API Tokens
+ * "payload.signature" where both parts are base64url and the signature is an
+ * HMAC-SHA256 of the payload under API_TOKEN_SECRET. Verifying a token is one
+ * hash and a constant-time comparison: no password check, session or query.
+ * Tokens cannot be revoked individually; rotate the secret to revoke them all.
+ */
+
+class ApiToken {
+    const DEFAULT_TTL = 2592000; // 30 days
+    const MAX_TTL = 31536000; // 1 year
+    const MIN_SECRET_LENGTH = 32;
+
+    /**
+     * Whether a usable signing secret is configured
+     */
+    public static function enabled() {
+        return strlen(self::secret()) >= self::MIN_SECRET_LENGTH;
+    }
+
+    /**
+     * Sign a token for an automation client
+     * Returns [token, expiry timestamp]
+     */
+    public static function issue($name, $issuedBy, $ttl = self::DEFAULT_TTL) {
+        if (!self::enabled()) {
+            throw new RuntimeException('API tokens are disabled: API_TOKEN_SECRET must be at least ' . self::MIN_SECRET_LENGTH . ' characters');
+        }
+        $now = time();
+        $expires = $now + max(60, min(self::MAX_TTL, intval($ttl)));
+        $payload = self::base64UrlEncode(json_encode([
+            'sub' => $name,
+            'iss' => $issuedBy,
+            'iat' => $now,
+            'exp' => $expires
+        ]));
+        return [$payload . '.' . self::sign($payload), $expires];
+    }
+
+    /**
+     * Return the token's claims, or null if it is malformed, forged or expired
+     */
+    public static function verify($token) {
+        if (!self::enabled() || substr_count($token, '.') !== 1) {
+            return null;
+        }
+        list($payload, $signature) = explode('.', $token);
+        if (!hash_equals(self::sign($payload), $signature)) {
+            return null;
+        }
+        $claims = json_decode(self::base64UrlDecode($payload), true);
+        if (!is_array($claims) || !isset($claims['sub'], $claims['exp']) || $claims['exp'] < time()) {
+            return null;
+        }
+        return $claims;
+    }
+
+    /**
+     * Bearer token of the current request, if any
+     */
+    public static function fromRequest() {
+        // Apache only exposes the header as REDIRECT_HTTP_AUTHORIZATION after a rewrite
+        $header = $_SERVER['HTTP_AUTHORIZATION'] ?? $_SERVER['REDIRECT_HTTP_AUTHORIZATION'] ?? '';
+        if (preg_match('/^Bearer\s+(\S+)$/i', $header, $matches)) {
+            return $matches[1];
+        }
+        return null;
+    }
+
+    private static function sign($payload) {
+        return self::base64UrlEncode(hash_hmac('sha256', $payload, self::secret(), true));
+    }
+
+    private static function secret() {
+        return (string)getenv('API_TOKEN_SECRET');
+    }
+
+    private static function base64UrlEncode($data) {
+        return rtrim(strtr(base64_encode($data), '+/', '-_'), '=');
+    }
+
+    private static function base64UrlDecode($data) {
+        return base64_decode(strtr($data, '-_', '+/'));
+    }
+}
+?>
@@ -0,0 +1,43 @@
+#!/usr/bin/env php
+<?php
+/**
+ * Address-space conflict report
+ *
+ * Usage: php conflicts_report.php [--site=NAME]
+ * Prints every overlapping pair of networks or leaf subnets from different
+ * configurations as CSV, streamed in address order as the sweep finds them
+ * (sort on the first columns to group by site and VLAN). Exits with status 1
+ * when conflicts are found so it can gate a change window.
+ */
+
+$included_from_api = true; // Skip db_init.php's own CLI bootstrap
+require_once __DIR__ . '/db_init.php';
+require_once __DIR__ . '/subnet_index.php';
+
+$options = getopt('', ['site:']);
+$site = $options['site'] ?? '';
+
+$database = new SubnetDatabase(null, true);
+$index = new SubnetIndex($database->getConnection());
+
+$out = fopen('php://stdout', 'w');
+fputcsv($out, ['Type', 'Site', 'Admin Number', 'Subnet', 'VLAN ID', 'VLAN Name', 'Conflicting Site', 'Conflicting Admin Number', 'Conflicting Subnet', 'Conflicting VLAN ID', 'Conflicting VLAN Name']);
+
+$count = 0;
+foreach ($index->findConflicts() as $conflict) {
+    $outer = $conflict['outer'];
+    $inner = $conflict['inner'];
+    if ($site !== '' && $outer['siteName'] !== $site && $inner['siteName'] !== $site) {
+        continue;
+    }
+    fputcsv($out, [
+        $conflict['type'],
+        $outer['siteName'], $outer['adminNumber'], $outer['subnet'], $outer['vlanId'], $outer['vlanName'],
+        $inner['siteName'], $inner['adminNumber'], $inner['subnet'], $inner['vlanId'], $inner['vlanName']
+    ]);
+    $count++;
+}
+
+fwrite(STDERR, "$count conflict(s) found\n");
+exit($count > 0 ? 1 : 0);
+?>
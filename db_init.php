@@ -1,7 +1,8 @@
 <?php
 /**
  * MySQL Database Initialization Script for Subnet Calculator
- * Creates the database and tables for storing subnet configurations
+ * Opens the database connection and, when run from the CLI, applies pending
+ * schema migrations from migrations/
  */
 
 class SubnetDatabase {
@@ -13,6 +14,8 @@ class SubnetDatabase {
     private $dbPort;
     private $silent;
     
+    const MIGRATION_LOCK_TIMEOUT = 60;
+    
     public function __construct($config = null, $silent = false) {
         // Get database configuration from environment variables or parameters
         if ($config && is_array($config)) {
@@ -35,19 +38,11 @@ class SubnetDatabase {
     
     private function initializeDatabase() {
         try {
-            // Create MySQL database connection
+            // Create MySQL database connection; the schema is managed by migrate()
             $dsn = "mysql:host={$this->dbHost};port={$this->dbPort};dbname={$this->dbName};charset=utf8mb4";
             $this->db = new PDO($dsn, $this->dbUser, $this->dbPassword);
             $this->db->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
             $this->db->setAttribute(PDO::ATTR_EMULATE_PREPARES, false);
-            
-            // Create the subnet_configurations table
-            $this->createTables();
-            
-            // Only echo when run directly from CLI and not silent
-            if (!$this->silent) {
-                echo "Database initialized successfully!\n";
-            }
         } catch (PDOException $e) {
             if (!$this->silent) {
                 die("Database connection failed: " . $e->getMessage());
@@ -57,55 +52,50 @@ class SubnetDatabase {
         }
     }
     
-    private function createTables() {
-        $sql = "
-        CREATE TABLE IF NOT EXISTS subnet_configurations (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            site_name VARCHAR(255) NOT NULL,
-            admin_number VARCHAR(100) NOT NULL,
-            network_address VARCHAR(50) NOT NULL,
-            mask_bits INT NOT NULL,
-            division_data TEXT,
-            vlan_ids TEXT,
-            vlan_names TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-            UNIQUE KEY unique_config (site_name, admin_number, network_address)
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    /**
+     * Apply pending migrations from the migrations/ directory in filename order
+     *
+     * Each migration file returns a callable taking the PDO connection and is
+     * recorded in schema_version once it succeeds. A named lock keeps several
+     * containers starting at once from running the same migration twice.
+     * Returns the names of the migrations applied.
+     */
+    public function migrate() {
+        $this->db->exec("
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version VARCHAR(100) PRIMARY KEY,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        ");
         
-        CREATE TABLE IF NOT EXISTS users (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            username VARCHAR(64) NOT NULL UNIQUE,
-            password_hash VARCHAR(255) NOT NULL,
-            role VARCHAR(20) NOT NULL DEFAULT 'user',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
-        ";
-        
-        // Execute each statement separately for MySQL
-        $statements = array_filter(array_map('trim', explode(';', $sql)));
-        foreach ($statements as $statement) {
-            if (!empty($statement)) {
-                $this->db->exec($statement);
-            }
+        $stmt = $this->db->query("SELECT GET_LOCK('subnets_schema_migration', " . self::MIGRATION_LOCK_TIMEOUT . ")");
+        if ((int)$stmt->fetchColumn() !== 1) {
+            throw new RuntimeException('Timed out waiting for another migration run to finish');
         }
         
-        // Create indexes if they don't exist (MySQL doesn't support IF NOT EXISTS for indexes)
-        try {
-            $this->db->exec("CREATE INDEX idx_site_admin ON subnet_configurations(site_name, admin_number)");
-        } catch (PDOException $e) {
-            // Index already exists, ignore
-        }
+        $applied = [];
         try {
-            $this->db->exec("CREATE INDEX idx_network ON subnet_configurations(network_address)");
-        } catch (PDOException $e) {
-            // Index already exists, ignore
-        }
-        try {
-            $this->db->exec("CREATE INDEX idx_created ON subnet_configurations(created_at DESC)");
-        } catch (PDOException $e) {
-            // Index already exists, ignore
+            $done = array_flip($this->db->query("SELECT version FROM schema_version")->fetchAll(PDO::FETCH_COLUMN));
+            $record = $this->db->prepare("INSERT INTO schema_version (version) VALUES (?)");
+            
+            $files = glob(__DIR__ . '/migrations/*.php') ?: [];
+            sort($files, SORT_STRING);
+            foreach ($files as $file) {
+                $version = basename($file, '.php');
+                if (isset($done[$version])) {
+                    continue;
+                }
+                // MySQL commits implicitly around DDL, so migrations must be re-runnable
+                $migration = require $file;
+                $migration($this->db);
+                $record->execute([$version]);
+                $applied[] = $version;
+            }
+        } finally {
+            $this->db->query("SELECT RELEASE_LOCK('subnets_schema_migration')");
         }
+        
+        return $applied;
     }
     
     public function getConnection() {
@@ -117,6 +107,9 @@ class SubnetDatabase {
 if (basename(__FILE__) == basename($_SERVER['SCRIPT_NAME']) || (php_sapi_name() === 'cli' && !isset($included_from_api))) {
     echo "Initializing Subnet Calculator database...\n";
     $database = new SubnetDatabase();
+    foreach ($database->migrate() as $version) {
+        echo "Applied migration $version\n";
+    }
     echo "Subnet Calculator database initialized successfully!\n";
 }
 ?>
\ No newline at end of file
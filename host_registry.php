@@ -0,0 +1,296 @@
+<?php
+/**
+ * Host Registry
+ * Per-host IP assignments inside leaf subnets. Every leaf keeps its occupancy
+ * as a bitset in host_bitmaps (one bit per address, most significant bit
+ * first, like the division data) next to one host_assignments row per
+ * assigned address. Bitsets are rebuilt from the detail rows whenever the
+ * leaf they describe changes shape.
+ */
+
+require_once __DIR__ . '/subnet_tree.php';
+
+class HostRegistry {
+    // Largest leaf tracked per host: a /16 bitset is 8 KB
+    const MIN_MASK = 16;
+
+    private $db;
+
+    public function __construct(PDO $db) {
+        $this->db = $db;
+    }
+
+    /**
+     * The leaf of a configuration containing an address, as [start, mask], or null
+     */
+    public function leafFor($configId, $ipLong) {
+        $starts = [];
+        for ($mask = 0; $mask <= 32; $mask++) {
+            $starts[] = $ipLong & SubnetTree::maskToLong($mask);
+        }
+        $starts = array_values(array_unique($starts));
+
+        $stmt = $this->db->prepare(
+            "SELECT start_ip, mask FROM subnet_entries
+             WHERE config_id = ? AND is_leaf = 1 AND start_ip IN (" . implode(',', array_fill(0, count($starts), '?')) . ")"
+        );
+        $stmt->execute(array_merge([$configId], $starts));
+        while ($row = $stmt->fetch(PDO::FETCH_ASSOC)) {
+            $start = (int)$row['start_ip'];
+            $mask = (int)$row['mask'];
+            if (($ipLong & SubnetTree::maskToLong($mask)) === $start) {
+                return [$start, $mask];
+            }
+        }
+        return null;
+    }
+
+    /**
+     * Leaves of a configuration holding at least one host, as start => mask
+     */
+    public function occupiedLeaves($configId) {
+        $stmt = $this->db->prepare(
+            "SELECT DISTINCT e.start_ip, e.mask FROM host_assignments a
+             JOIN subnet_entries e
+               ON e.config_id = a.config_id AND e.start_ip IN (" . self::leafStarts('a.ip') . ")
+              AND e.is_leaf = 1 AND e.end_ip >= a.ip
+             WHERE a.config_id = ?"
+        );
+        $stmt->execute([$configId]);
+        $leaves = [];
+        while ($row = $stmt->fetch(PDO::FETCH_ASSOC)) {
+            $leaves[(int)$row['start_ip']] = (int)$row['mask'];
+        }
+        return $leaves;
+    }
+
+    /**
+     * Hosts of some configurations the subnet_entries just written leave
+     * without a usable address: outside every tracked leaf, or on a leaf's
+     * network or broadcast address. At most $limit rows, in address order.
+     */
+    public function orphans(array $configIds, $limit = 100) {
+        $stmt = $this->db->prepare(
+            "SELECT a.config_id, a.ip, a.hostname, a.mac, a.assigned_by, a.assigned_at FROM host_assignments a
+             WHERE a.config_id IN (" . implode(',', array_fill(0, count($configIds), '?')) . ")
+               AND NOT EXISTS (
+                   SELECT 1 FROM subnet_entries e
+                   WHERE e.config_id = a.config_id AND e.start_ip IN (" . self::leafStarts('a.ip') . ")
+                     AND e.is_leaf = 1 AND e.mask >= " . self::MIN_MASK . " AND e.end_ip >= a.ip
+                     AND (e.mask >= 31 OR (a.ip > e.start_ip AND a.ip < e.end_ip))
+               )
+             ORDER BY a.ip, a.config_id
+             LIMIT " . (int)$limit
+        );
+        $stmt->execute(array_values($configIds));
+        return $stmt->fetchAll(PDO::FETCH_ASSOC);
+    }
+
+    /**
+     * Occupancy bitset of a leaf, locked for update inside the caller's transaction
+     */
+    public function lockBitmap($configId, $start, $mask) {
+        $this->ensureBitmap($configId, $start, $mask);
+        $stmt = $this->db->prepare(
+            "SELECT bitmap FROM host_bitmaps WHERE config_id = ? AND start_ip = ? AND mask = ? FOR UPDATE"
+        );
+        $stmt->execute([$configId, $start, $mask]);
+        return $stmt->fetchColumn();
+    }
+
+    /**
+     * Record a host at $ipLong and write back the leaf's bitset, which the
+     * caller locked with lockBitmap() and has already checked is free there
+     */
+    public function assign($configId, $start, $mask, $bitmap, $ipLong, $hostname, $mac, $assignedBy) {
+        $stmt = $this->db->prepare(
+            "INSERT INTO host_assignments (config_id, ip, hostname, mac, assigned_by) VALUES (?, ?, ?, ?, ?)"
+        );
+        $stmt->execute([$configId, $ipLong, $hostname, $mac, $assignedBy]);
+
+        self::setBit($bitmap, $ipLong - $start, true);
+        $this->storeBitmap($configId, $start, $mask, $bitmap, 1);
+    }
+
+    /**
+     * Remove the host at $ipLong; returns false when the address was not assigned
+     *
+     * A row left on the network or broadcast address was never counted in
+     * the bitset, whose bit for it stays set.
+     */
+    public function release($configId, $start, $mask, $bitmap, $ipLong) {
+        $stmt = $this->db->prepare("DELETE FROM host_assignments WHERE config_id = ? AND ip = ?");
+        $stmt->execute([$configId, $ipLong]);
+        if ($stmt->rowCount() === 0) {
+            return false;
+        }
+        if (self::isReserved($mask, $ipLong - $start)) {
+            return true;
+        }
+
+        self::setBit($bitmap, $ipLong - $start, false);
+        $this->storeBitmap($configId, $start, $mask, $bitmap, -1);
+        return true;
+    }
+
+    /**
+     * Assigned, usable and next free address of a leaf, without locking
+     */
+    public function usage($configId, $start, $mask) {
+        $this->ensureBitmap($configId, $start, $mask);
+        $stmt = $this->db->prepare(
+            "SELECT bitmap, assigned_count FROM host_bitmaps WHERE config_id = ? AND start_ip = ? AND mask = ?"
+        );
+        $stmt->execute([$configId, $start, $mask]);
+        $row = $stmt->fetch(PDO::FETCH_ASSOC);
+
+        $offset = self::nextFree($row['bitmap']);
+        return [
+            'assigned' => (int)$row['assigned_count'],
+            'usable' => self::usableHosts($mask),
+            'nextFree' => $offset === null ? null : $start + $offset
+        ];
+    }
+
+    /**
+     * Hosts assigned between two addresses in address order, keyset-paged by $after
+     */
+    public function hosts($configId, $start, $end, $after = null, $limit = 100) {
+        $stmt = $this->db->prepare(
+            "SELECT ip, hostname, mac, assigned_by, assigned_at FROM host_assignments
+             WHERE config_id = ? AND ip BETWEEN ? AND ?
+             ORDER BY ip
+             LIMIT " . (int)$limit
+        );
+        $stmt->execute([$configId, $after === null ? $start : max($start, $after + 1), $end]);
+        return $stmt->fetchAll(PDO::FETCH_ASSOC);
+    }
+
+    /**
+     * Host records for an address in every configuration, keyed by config ID
+     */
+    public function find($ipLong) {
+        $stmt = $this->db->prepare(
+            "SELECT config_id, ip, hostname, mac, assigned_by, assigned_at FROM host_assignments WHERE ip = ?"
+        );
+        $stmt->execute([$ipLong]);
+        $hosts = [];
+        while ($row = $stmt->fetch(PDO::FETCH_ASSOC)) {
+            $hosts[(int)$row['config_id']] = $row;
+        }
+        return $hosts;
+    }
+
+    /**
+     * Addresses a leaf can hand out: all but the network and broadcast
+     * address, except on /31 point-to-point links and /32 host routes
+     */
+    public static function usableHosts($mask) {
+        $size = 1 << (32 - $mask);
+        return $mask >= 31 ? $size : $size - 2;
+    }
+
+    /**
+     * Offset of the first clear bit, or null when the leaf is full
+     *
+     * Whole bytes of taken addresses are skipped with strspn, so a /16 is
+     * scanned in one pass over at most 8 KB.
+     */
+    public static function nextFree($bitmap) {
+        $byte = strspn($bitmap, "\xFF");
+        if ($byte >= strlen($bitmap)) {
+            return null;
+        }
+        $value = ord($bitmap[$byte]);
+        for ($bit = 0; $value & (0x80 >> $bit); $bit++);
+        return $byte * 8 + $bit;
+    }
+
+    /**
+     * Whether an offset is the network or broadcast address of a /$mask leaf
+     */
+    public static function isReserved($mask, $offset) {
+        return $mask < 31 && ($offset === 0 || $offset === (1 << (32 - $mask)) - 1);
+    }
+
+    /**
+     * SQL list of the starts a tracked leaf holding $column can have: the
+     * address masked to every length from MIN_MASK to 32
+     */
+    private static function leafStarts($column) {
+        $starts = [];
+        for ($mask = self::MIN_MASK; $mask <= 32; $mask++) {
+            $starts[] = "$column & " . SubnetTree::maskToLong($mask);
+        }
+        return implode(', ', $starts);
+    }
+
+    public static function isSet($bitmap, $offset) {
+        return (bool)(ord($bitmap[$offset >> 3]) & (0x80 >> ($offset & 7)));
+    }
+
+    public static function setBit(&$bitmap, $offset, $on) {
+        $value = ord($bitmap[$offset >> 3]);
+        $bit = 0x80 >> ($offset & 7);
+        $bitmap[$offset >> 3] = chr($on ? $value | $bit : $value & ~$bit);
+    }
+
+    /**
+     * Create a missing bitset from the leaf's detail rows. The network and
+     * broadcast addresses and the padding of leaves under 8 addresses are
+     * set so nextFree() never returns them, and rows on those addresses are
+     * not counted.
+     */
+    private function ensureBitmap($configId, $start, $mask) {
+        $stmt = $this->db->prepare("SELECT 1 FROM host_bitmaps WHERE config_id = ? AND start_ip = ? AND mask = ?");
+        $stmt->execute([$configId, $start, $mask]);
+        if ($stmt->fetchColumn()) {
+            return;
+        }
+
+        $size = 1 << (32 - $mask);
+        $bitmap = str_repeat("\0", ($size + 7) >> 3);
+        for ($offset = $size; $offset < strlen($bitmap) * 8; $offset++) {
+            self::setBit($bitmap, $offset, true);
+        }
+        if ($mask < 31) {
+            self::setBit($bitmap, 0, true);
+            self::setBit($bitmap, $size - 1, true);
+        }
+
+        $stmt = $this->db->prepare("SELECT ip FROM host_assignments WHERE config_id = ? AND ip BETWEEN ? AND ?");
+        $stmt->execute([$configId, $start, $start + $size - 1]);
+        $count = 0;
+        while (($ip = $stmt->fetchColumn()) !== false) {
+            if (!self::isReserved($mask, (int)$ip - $start)) {
+                self::setBit($bitmap, (int)$ip - $start, true);
+                $count++;
+            }
+        }
+
+        // Another request may have built the same bitset meanwhile
+        $stmt = $this->db->prepare(
+            "INSERT IGNORE INTO host_bitmaps (config_id, start_ip, mask, bitmap, assigned_count) VALUES (?, ?, ?, ?, ?)"
+        );
+        $stmt->bindValue(1, $configId, PDO::PARAM_INT);
+        $stmt->bindValue(2, $start, PDO::PARAM_INT);
+        $stmt->bindValue(3, $mask, PDO::PARAM_INT);
+        $stmt->bindValue(4, $bitmap, PDO::PARAM_LOB);
+        $stmt->bindValue(5, $count, PDO::PARAM_INT);
+        $stmt->execute();
+    }
+
+    private function storeBitmap($configId, $start, $mask, $bitmap, $delta) {
+        $stmt = $this->db->prepare(
+            "UPDATE host_bitmaps SET bitmap = ?, assigned_count = assigned_count + ?
+             WHERE config_id = ? AND start_ip = ? AND mask = ?"
+        );
+        $stmt->bindValue(1, $bitmap, PDO::PARAM_LOB);
+        $stmt->bindValue(2, $delta, PDO::PARAM_INT);
+        $stmt->bindValue(3, $configId, PDO::PARAM_INT);
+        $stmt->bindValue(4, $start, PDO::PARAM_INT);
+        $stmt->bindValue(5, $mask, PDO::PARAM_INT);
+        $stmt->execute();
+    }
+}
+?>
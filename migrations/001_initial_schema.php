@@ -0,0 +1,48 @@
+<?php
+/**
+ * Base configuration and user tables
+ */
+
+return function (PDO $db) {
+    $db->exec("
+        CREATE TABLE IF NOT EXISTS subnet_configurations (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            site_name VARCHAR(255) NOT NULL,
+            admin_number VARCHAR(100) NOT NULL,
+            network_address VARCHAR(50) NOT NULL,
+            mask_bits INT NOT NULL,
+            division_data TEXT,
+            vlan_ids TEXT,
+            vlan_names TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE KEY unique_config (site_name, admin_number, network_address)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    ");
+
+    $db->exec("
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(64) NOT NULL UNIQUE,
+            password_hash VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    ");
+
+    // Databases created before migrations existed may already have these
+    $indexes = [
+        'idx_site_admin' => 'site_name, admin_number',
+        'idx_network' => 'network_address',
+        'idx_created' => 'created_at DESC'
+    ];
+    foreach ($indexes as $name => $columns) {
+        try {
+            $db->exec("CREATE INDEX $name ON subnet_configurations($columns)");
+        } catch (PDOException $e) {
+            // Index already exists (ER_DUP_KEYNAME), ignore
+            if (($e->errorInfo[1] ?? null) !== 1061) {
+                throw $e;
+            }
+        }
+    }
+};
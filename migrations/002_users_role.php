@@ -0,0 +1,14 @@
+<?php
+/**
+ * Role column for users, replacing the one-off add_role_column.php script
+ */
+
+return function (PDO $db) {
+    $stmt = $db->query("SHOW COLUMNS FROM users LIKE 'role'");
+    if ($stmt->rowCount() > 0) {
+        return;
+    }
+
+    $db->exec("ALTER TABLE users ADD COLUMN role VARCHAR(20) NOT NULL DEFAULT 'user' AFTER password_hash");
+    $db->exec("UPDATE users SET role = 'admin' WHERE username = 'admin'");
+};
@@ -0,0 +1,31 @@
+<?php
+/**
+ * Materialized subnet lookup index and the global data version
+ * (entries are filled by rebuild_subnet_index.php)
+ */
+
+return function (PDO $db) {
+    $db->exec("
+        CREATE TABLE IF NOT EXISTS subnet_entries (
+            config_id INT NOT NULL,
+            start_ip INT UNSIGNED NOT NULL,
+            end_ip INT UNSIGNED NOT NULL,
+            mask TINYINT UNSIGNED NOT NULL,
+            vlan_id SMALLINT UNSIGNED NULL,
+            vlan_name TEXT,
+            is_leaf TINYINT(1) NOT NULL DEFAULT 1,
+            PRIMARY KEY (config_id, start_ip, mask),
+            KEY idx_entry_range (start_ip, end_ip DESC),
+            CONSTRAINT fk_entry_config FOREIGN KEY (config_id)
+                REFERENCES subnet_configurations(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    ");
+
+    $db->exec("
+        CREATE TABLE IF NOT EXISTS data_version (
+            id TINYINT UNSIGNED PRIMARY KEY,
+            version BIGINT UNSIGNED NOT NULL DEFAULT 0
+        ) ENGINE=InnoDB
+    ");
+    $db->exec("INSERT IGNORE INTO data_version (id, version) VALUES (1, 0)");
+};
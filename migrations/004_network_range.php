@@ -0,0 +1,37 @@
+<?php
+/**
+ * Numeric network range used by overlap validation and CIDR search
+ */
+
+return function (PDO $db) {
+    try {
+        $db->exec("ALTER TABLE subnet_configurations ADD COLUMN net_start INT UNSIGNED NULL AFTER mask_bits, ADD COLUMN net_end INT UNSIGNED NULL AFTER net_start");
+    } catch (PDOException $e) {
+        // Columns already exist (ER_DUP_FIELDNAME), ignore
+        if (($e->errorInfo[1] ?? null) !== 1060) {
+            throw $e;
+        }
+    }
+    $db->exec(
+        "UPDATE subnet_configurations
+         SET net_start = INET_ATON(SUBSTRING_INDEX(network_address, '/', 1)) & (0xFFFFFFFF << (32 - mask_bits)) & 0xFFFFFFFF,
+             net_end = (INET_ATON(SUBSTRING_INDEX(network_address, '/', 1)) & (0xFFFFFFFF << (32 - mask_bits)) & 0xFFFFFFFF) + (1 << (32 - mask_bits)) - 1,
+             updated_at = updated_at
+         WHERE net_start IS NULL"
+    );
+
+    $indexes = [
+        'idx_net_range' => 'net_start, net_end',
+        'idx_site_range' => 'site_name, net_start, net_end'
+    ];
+    foreach ($indexes as $name => $columns) {
+        try {
+            $db->exec("CREATE INDEX $name ON subnet_configurations($columns)");
+        } catch (PDOException $e) {
+            // Index already exists (ER_DUP_KEYNAME), ignore
+            if (($e->errorInfo[1] ?? null) !== 1061) {
+                throw $e;
+            }
+        }
+    }
+};
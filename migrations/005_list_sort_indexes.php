@@ -0,0 +1,23 @@
+<?php
+/**
+ * Keyset pagination indexes for each listConfigurations sort key
+ */
+
+return function (PDO $db) {
+    $indexes = [
+        'idx_updated_id' => 'updated_at, id',
+        'idx_site_id' => 'site_name, id',
+        'idx_network_id' => 'net_start, id',
+        'idx_admin_id' => 'admin_number, id'
+    ];
+    foreach ($indexes as $name => $columns) {
+        try {
+            $db->exec("CREATE INDEX $name ON subnet_configurations($columns)");
+        } catch (PDOException $e) {
+            // Index already exists (ER_DUP_KEYNAME), ignore
+            if (($e->errorInfo[1] ?? null) !== 1061) {
+                throw $e;
+            }
+        }
+    }
+};
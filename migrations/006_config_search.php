@@ -0,0 +1,24 @@
+<?php
+/**
+ * Full-text search over site, admin number and decoded VLAN names
+ * (vlan_text is filled by rebuild_subnet_index.php)
+ */
+
+return function (PDO $db) {
+    try {
+        $db->exec("ALTER TABLE subnet_configurations ADD COLUMN vlan_text TEXT NULL AFTER vlan_names");
+    } catch (PDOException $e) {
+        // Column already exists (ER_DUP_FIELDNAME), ignore
+        if (($e->errorInfo[1] ?? null) !== 1060) {
+            throw $e;
+        }
+    }
+    try {
+        $db->exec("CREATE FULLTEXT INDEX ft_config_search ON subnet_configurations(site_name, admin_number, vlan_text) WITH PARSER ngram");
+    } catch (PDOException $e) {
+        // Index already exists (ER_DUP_KEYNAME), ignore
+        if (($e->errorInfo[1] ?? null) !== 1061) {
+            throw $e;
+        }
+    }
+};
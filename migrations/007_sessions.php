@@ -0,0 +1,15 @@
+<?php
+/**
+ * Session storage for SESSION_HANDLER=database
+ */
+
+return function (PDO $db) {
+    $db->exec("
+        CREATE TABLE IF NOT EXISTS sessions (
+            id VARCHAR(128) NOT NULL PRIMARY KEY,
+            data MEDIUMBLOB NOT NULL,
+            last_activity INT UNSIGNED NOT NULL,
+            KEY idx_session_activity (last_activity)
+        ) ENGINE=InnoDB
+    ");
+};
@@ -0,0 +1,34 @@
+<?php
+/**
+ * Normalized VLAN assignments, one row per subnet with a VLAN ID or name
+ * (kept in step with vlan_ids/vlan_names by SubnetIndex on every save)
+ */
+
+return function (PDO $db) {
+    $db->exec("
+        CREATE TABLE IF NOT EXISTS subnet_vlans (
+            config_id INT NOT NULL,
+            start_ip INT UNSIGNED NOT NULL,
+            mask TINYINT UNSIGNED NOT NULL,
+            site_name VARCHAR(255) NOT NULL,
+            vlan_id SMALLINT UNSIGNED NULL,
+            vlan_name VARCHAR(255) NULL,
+            PRIMARY KEY (config_id, start_ip, mask),
+            KEY idx_vlan_id (vlan_id),
+            KEY idx_vlan_name (vlan_name),
+            KEY idx_vlan_site (site_name, vlan_id),
+            CONSTRAINT fk_vlan_config FOREIGN KEY (config_id)
+                REFERENCES subnet_configurations(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    ");
+
+    // Backfill from the lookup index; configurations missing from it are
+    // picked up by rebuild_subnet_index.php
+    $db->exec("
+        INSERT IGNORE INTO subnet_vlans (config_id, start_ip, mask, site_name, vlan_id, vlan_name)
+        SELECT e.config_id, e.start_ip, e.mask, c.site_name, e.vlan_id, LEFT(e.vlan_name, 255)
+        FROM subnet_entries e
+        JOIN subnet_configurations c ON c.id = e.config_id
+        WHERE e.vlan_id IS NOT NULL OR e.vlan_name IS NOT NULL
+    ");
+};
@@ -0,0 +1,23 @@
+<?php
+/**
+ * Utilization columns refreshed by SubnetIndex on every save
+ * (existing configurations are filled by rebuild_subnet_index.php)
+ */
+
+return function (PDO $db) {
+    try {
+        $db->exec(
+            "ALTER TABLE subnet_configurations
+             ADD COLUMN leaf_count INT UNSIGNED NULL AFTER vlan_text,
+             ADD COLUMN allocated_leaves INT UNSIGNED NULL AFTER leaf_count,
+             ADD COLUMN allocated_addresses BIGINT UNSIGNED NULL AFTER allocated_leaves,
+             ADD COLUMN free_addresses BIGINT UNSIGNED NULL AFTER allocated_addresses,
+             ADD COLUMN largest_free_mask TINYINT UNSIGNED NULL AFTER free_addresses"
+        );
+    } catch (PDOException $e) {
+        // Columns already exist (ER_DUP_FIELDNAME), ignore
+        if (($e->errorInfo[1] ?? null) !== 1060) {
+            throw $e;
+        }
+    }
+};
@@ -0,0 +1,36 @@
+<?php
+/**
+ * Per-host IP assignments: one detail row per assigned address and one
+ * occupancy bitset per leaf subnet (rebuilt from the detail rows when missing)
+ */
+
+return function (PDO $db) {
+    $db->exec("
+        CREATE TABLE IF NOT EXISTS host_assignments (
+            config_id INT NOT NULL,
+            ip INT UNSIGNED NOT NULL,
+            hostname VARCHAR(255) NOT NULL,
+            mac CHAR(17) NULL,
+            assigned_by VARCHAR(100) NULL,
+            assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (config_id, ip),
+            KEY idx_host_ip (ip),
+            KEY idx_hostname (hostname),
+            CONSTRAINT fk_host_config FOREIGN KEY (config_id)
+                REFERENCES subnet_configurations(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    ");
+
+    $db->exec("
+        CREATE TABLE IF NOT EXISTS host_bitmaps (
+            config_id INT NOT NULL,
+            start_ip INT UNSIGNED NOT NULL,
+            mask TINYINT UNSIGNED NOT NULL,
+            bitmap MEDIUMBLOB NOT NULL,
+            assigned_count INT UNSIGNED NOT NULL DEFAULT 0,
+            PRIMARY KEY (config_id, start_ip, mask),
+            CONSTRAINT fk_bitmap_config FOREIGN KEY (config_id)
+                REFERENCES subnet_configurations(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+    ");
+};
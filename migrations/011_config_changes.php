@@ -0,0 +1,30 @@
+<?php
+/**
+ * Change tracking for action=changes: every write stamps the configuration
+ * with the data version it committed under, and deletions leave a tombstone
+ * carrying theirs
+ */
+
+return function (PDO $db) {
+    try {
+        $db->exec(
+            "ALTER TABLE subnet_configurations
+             ADD COLUMN row_version BIGINT UNSIGNED NOT NULL DEFAULT 0 AFTER updated_at,
+             ADD KEY idx_row_version (row_version, id)"
+        );
+    } catch (PDOException $e) {
+        // Column already exists (ER_DUP_FIELDNAME), ignore
+        if (($e->errorInfo[1] ?? null) !== 1060) {
+            throw $e;
+        }
+    }
+
+    $db->exec("
+        CREATE TABLE IF NOT EXISTS config_tombstones (
+            config_id INT PRIMARY KEY,
+            row_version BIGINT UNSIGNED NOT NULL,
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            KEY idx_tombstone_version (row_version)
+        ) ENGINE=InnoDB
+    ");
+};
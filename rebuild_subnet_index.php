@@ -0,0 +1,43 @@
+#!/usr/bin/env php
+<?php
+/**
+ * Rebuild the subnet_entries lookup index from saved configurations
+ *
+ * Usage: php rebuild_subnet_index.php [--all]
+ * Without --all only configurations missing from the index or without
+ * VLAN search text or utilization statistics are processed.
+ */
+
+$included_from_api = true; // Skip db_init.php's own CLI bootstrap
+require_once __DIR__ . '/db_init.php';
+require_once __DIR__ . '/subnet_index.php';
+require_once __DIR__ . '/subnet_trie.php';
+
+$rebuildAll = in_array('--all', $argv ?? [], true);
+
+$database = new SubnetDatabase(null, true);
+$db = $database->getConnection();
+$index = new SubnetIndex($db);
+
+$sql = "SELECT c.id, c.network_address, c.division_data, c.vlan_ids, c.vlan_names
+        FROM subnet_configurations c";
+if (!$rebuildAll) {
+    $sql .= " WHERE c.vlan_text IS NULL OR c.leaf_count IS NULL
+              OR NOT EXISTS (SELECT 1 FROM subnet_entries e WHERE e.config_id = c.id)";
+}
+$configurations = $db->query($sql)->fetchAll(PDO::FETCH_ASSOC);
+
+foreach ($configurations as $config) {
+    $db->beginTransaction();
+    try {
+        $index->rebuild($config['id'], $config['network_address'], $config['division_data'], $config['vlan_ids'], $config['vlan_names']);
+        SubnetTrie::bumpVersion($db);
+        $db->commit();
+    } catch (PDOException $e) {
+        $db->rollBack();
+        echo "Failed to index configuration {$config['id']}: " . $e->getMessage() . "\n";
+    }
+}
+
+echo "Indexed " . count($configurations) . " configuration(s)\n";
+?>
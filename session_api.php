@@ -8,21 +8,6 @@ declare(strict_types=1);
 ini_set('display_errors', '0');
 error_reporting(E_ALL);
 
-// Start PHP session
-if (session_status() === PHP_SESSION_NONE) {
-    // Session cookie params: secure defaults; path "/" so it works for both / and /subnets base
-    $secure = (!empty($_SERVER['HTTPS']) && $_SERVER['HTTPS'] !== 'off') || (isset($_SERVER['SERVER_PORT']) && $_SERVER['SERVER_PORT'] == 443);
-    session_set_cookie_params([
-        'lifetime' => 0,
-        'path' => '/',
-        'domain' => '',
-        'secure' => $secure,
-        'httponly' => true,
-        'samesite' => 'Lax'
-    ]);
-    session_start();
-}
-
 header('Content-Type: application/json; charset=utf-8');
 
 // Basic JSON output helper
@@ -50,6 +35,11 @@ try {
     }
     $pdo->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
     $pdo->setAttribute(PDO::ATTR_EMULATE_PREPARES, false);
+    
+    // Load the session read-only; actions that change it reopen it explicitly
+    require_once __DIR__ . '/session_store.php';
+    require_once __DIR__ . '/api_token.php';
+    SessionStore::start($pdo);
 } catch (Throwable $e) {
     json_response(['success' => false, 'message' => 'DB init failed: ' . $e->getMessage()], 500);
     exit;
@@ -148,10 +138,13 @@ try {
                 break;
             }
 
-            // Auth OK — initialize session
+            // Auth OK — initialize session under a fresh id
+            SessionStore::open();
+            session_regenerate_id(true);
             $_SESSION['username'] = $username;
             $_SESSION['is_admin'] = ($username === 'admin');
             $_SESSION['user_id'] = 1; // For api.php compatibility
+            SessionStore::commit();
             json_response([
                 'success' => true,
                 'user' => [
@@ -164,6 +157,7 @@ try {
 
         case 'logout': {
             // Clear session
+            SessionStore::open();
             $_SESSION = [];
             if (ini_get('session.use_cookies')) {
                 $params = session_get_cookie_params();
@@ -246,6 +240,30 @@ try {
             break;
         }
 
+        case 'create_token': {
+            require_admin();
+            $body = read_json_body();
+            if (empty($body)) {
+                $body = $_POST;
+            }
+            $name = trim((string)($body['name'] ?? ''));
+            if ($name === '') {
+                json_response(['success' => false, 'message' => 'Token name required'], 400);
+                break;
+            }
+            if (!ApiToken::enabled()) {
+                json_response(['success' => false, 'message' => 'API tokens are disabled: set API_TOKEN_SECRET'], 400);
+                break;
+            }
+            [$token, $expires] = ApiToken::issue($name, current_user(), (int)($body['ttl'] ?? ApiToken::DEFAULT_TTL));
+            json_response([
+                'success' => true,
+                'token' => $token,
+                'expires_at' => gmdate('c', $expires)
+            ]);
+            break;
+        }
+
         default: {
             json_response(['success' => false, 'message' => 'Unknown action'], 400);
         }
@@ -0,0 +1,165 @@
+<?php
+/**
+ * Non-blocking Session Layer
+ * Sessions are read and closed immediately so concurrent requests from one
+ * browser never queue on the session lock; only writes reopen the session.
+ * Storage is selected with SESSION_HANDLER: "files" (default), "database"
+ * or "apcu".
+ */
+
+class SessionStore {
+    // Longest time between two refreshes of an active session's timestamp
+    const TOUCH_INTERVAL = 60;
+
+    /**
+     * Configure the cookie and storage backend, then load $_SESSION read-only
+     *
+     * A read-and-close start never writes, so nothing would tell the
+     * garbage collector the session is in use: once every TOUCH_INTERVAL
+     * (or half the GC lifetime, if shorter) the session is reopened for a
+     * moment to record the request time, which also refreshes the file
+     * mtime, the sessions.last_activity row or the APCu TTL.
+     */
+    public static function start(?PDO $db = null) {
+        if (session_status() !== PHP_SESSION_NONE) {
+            return;
+        }
+
+        // Session cookie params: secure defaults; path "/" so it works for both / and /subnets base
+        $secure = (!empty($_SERVER['HTTPS']) && $_SERVER['HTTPS'] !== 'off') || (isset($_SERVER['SERVER_PORT']) && $_SERVER['SERVER_PORT'] == 443);
+        session_set_cookie_params([
+            'lifetime' => 0,
+            'path' => '/',
+            'domain' => '',
+            'secure' => $secure,
+            'httponly' => true,
+            'samesite' => 'Lax'
+        ]);
+
+        $handler = getenv('SESSION_HANDLER') ?: 'files';
+        if ($handler === 'database' && $db !== null) {
+            session_set_save_handler(new DatabaseSessionHandler($db), true);
+        } elseif ($handler === 'apcu' && function_exists('apcu_enabled') && apcu_enabled()) {
+            session_set_save_handler(new ApcuSessionHandler(), true);
+        }
+
+        session_start(['read_and_close' => true]);
+
+        $interval = min(self::TOUCH_INTERVAL, intdiv((int)ini_get('session.gc_maxlifetime'), 2));
+        if ($_SESSION && time() - ($_SESSION['last_touch'] ?? 0) >= $interval) {
+            self::open();
+            // Unless a concurrent logout emptied it meanwhile
+            if ($_SESSION) {
+                $_SESSION['last_touch'] = time();
+            }
+            self::commit();
+        }
+    }
+
+    /**
+     * Reopen the session for writing; pair with commit() before any output
+     */
+    public static function open() {
+        if (session_status() !== PHP_SESSION_ACTIVE) {
+            session_start();
+        }
+    }
+
+    public static function commit() {
+        if (session_status() === PHP_SESSION_ACTIVE) {
+            session_write_close();
+        }
+    }
+}
+
+/**
+ * Sessions in the `sessions` table: reads are plain primary-key lookups
+ * without row locks, so parallel requests never wait on each other
+ */
+class DatabaseSessionHandler implements SessionHandlerInterface, SessionUpdateTimestampHandlerInterface {
+    private $db;
+
+    public function __construct(PDO $db) {
+        $this->db = $db;
+    }
+
+    public function open(string $path, string $name): bool {
+        return true;
+    }
+
+    public function close(): bool {
+        return true;
+    }
+
+    public function read(string $id): string|false {
+        $stmt = $this->db->prepare("SELECT data FROM sessions WHERE id = ? AND last_activity >= ?");
+        $stmt->execute([$id, time() - (int)ini_get('session.gc_maxlifetime')]);
+        $data = $stmt->fetchColumn();
+        return $data === false ? '' : $data;
+    }
+
+    public function write(string $id, string $data): bool {
+        $stmt = $this->db->prepare(
+            "INSERT INTO sessions (id, data, last_activity) VALUES (?, ?, ?)
+             ON DUPLICATE KEY UPDATE data = VALUES(data), last_activity = VALUES(last_activity)"
+        );
+        return $stmt->execute([$id, $data, time()]);
+    }
+
+    public function destroy(string $id): bool {
+        $stmt = $this->db->prepare("DELETE FROM sessions WHERE id = ?");
+        return $stmt->execute([$id]);
+    }
+
+    public function gc(int $max_lifetime): int|false {
+        $stmt = $this->db->prepare("DELETE FROM sessions WHERE last_activity < ?");
+        $stmt->execute([time() - $max_lifetime]);
+        return $stmt->rowCount();
+    }
+
+    public function validateId(string $id): bool {
+        $stmt = $this->db->prepare("SELECT 1 FROM sessions WHERE id = ?");
+        $stmt->execute([$id]);
+        return $stmt->fetchColumn() !== false;
+    }
+
+    public function updateTimestamp(string $id, string $data): bool {
+        $stmt = $this->db->prepare("UPDATE sessions SET last_activity = ? WHERE id = ?");
+        return $stmt->execute([time(), $id]);
+    }
+}
+
+/**
+ * Sessions in APCu shared memory, expired by the entry TTL
+ * (single web server only: APCu is not shared between hosts)
+ */
+class ApcuSessionHandler implements SessionHandlerInterface {
+    const KEY_PREFIX = 'subnets_session_';
+
+    public function open(string $path, string $name): bool {
+        return true;
+    }
+
+    public function close(): bool {
+        return true;
+    }
+
+    public function read(string $id): string|false {
+        $data = apcu_fetch(self::KEY_PREFIX . $id);
+        return $data === false ? '' : $data;
+    }
+
+    public function write(string $id, string $data): bool {
+        return apcu_store(self::KEY_PREFIX . $id, $data, (int)ini_get('session.gc_maxlifetime'));
+    }
+
+    public function destroy(string $id): bool {
+        apcu_delete(self::KEY_PREFIX . $id);
+        return true;
+    }
+
+    public function gc(int $max_lifetime): int|false {
+        return 0;
+    }
+}
+?>
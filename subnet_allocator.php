@@ -0,0 +1,106 @@
+<?php
+/**
+ * Buddy Allocator
+ * Free lists per prefix length over the leaves of one saved configuration,
+ * used by action=allocate to carve out blocks of a given size
+ */
+
+require_once __DIR__ . '/subnet_tree.php';
+
+class SubnetAllocator {
+    private $baseStart;
+    private $baseMask;
+    private $leaves = [];  // start => mask of every leaf
+    private $free = [];    // mask => SplMinHeap of free leaf starts
+
+    /**
+     * A leaf is free when it has neither a VLAN ID nor a description, nor
+     * any assigned host ($occupied, start => mask as HostRegistry::occupiedLeaves())
+     *
+     * Free buddies are coalesced as the leaves are read, so a /24 divided
+     * into four empty /26 can still hand out a /25. The saved division is
+     * only redrawn inside the blocks actually carved up.
+     */
+    public function __construct($networkAddress, $divisionData, $vlanIds = '', $vlanNames = '', array $occupied = []) {
+        list($this->baseStart, , $this->baseMask) = SubnetTree::networkRange($networkAddress);
+
+        // Free blocks in address order; leaves come in preorder, so a block's buddy is the one before it
+        $pending = [];
+        foreach (SubnetTree::walk($networkAddress, $divisionData, $vlanIds, $vlanNames) as $node) {
+            if (!$node['isLeaf']) {
+                continue;
+            }
+            $this->leaves[$node['start']] = $node['mask'];
+            if ($node['vlanId'] !== null || $node['vlanName'] !== '' || ($occupied[$node['start']] ?? null) === $node['mask']) {
+                continue;
+            }
+
+            $start = $node['start'];
+            $mask = $node['mask'];
+            while ($pending && end($pending) === [$start - (1 << (32 - $mask)), $mask] && ($start >> (32 - $mask)) & 1) {
+                array_pop($pending);
+                $start -= 1 << (32 - $mask);
+                $mask--;
+            }
+            $pending[] = [$start, $mask];
+        }
+        foreach ($pending as list($start, $mask)) {
+            $this->addFree($start, $mask);
+        }
+    }
+
+    /**
+     * Carve a /$mask out of the smallest free block able to hold it (the
+     * lowest of that size), keeping its lowest part; returns its start or null
+     *
+     * This is best fit, not first fit: a free /26 at a high address is used
+     * before a lower free /24 is split, so the result is not necessarily the
+     * lowest free address. At most one free list per prefix length is
+     * inspected, so a block is found in O(depth) heap operations.
+     */
+    public function allocate($mask) {
+        for ($size = $mask; $size >= $this->baseMask; $size--) {
+            if (!isset($this->free[$size]) || $this->free[$size]->isEmpty()) {
+                continue;
+            }
+
+            $start = $this->free[$size]->extract();
+            // Every split keeps the lower half and frees its buddy
+            for ($half = $size + 1; $half <= $mask; $half++) {
+                $buddy = $start + (1 << (32 - $half));
+                $this->leaves[$buddy] = $half;
+                $this->addFree($buddy, $half);
+            }
+            $this->leaves[$start] = $mask;
+            return $start;
+        }
+        return null;
+    }
+
+    /**
+     * Division string of the tree after the allocations so far
+     */
+    public function divisionData() {
+        $bits = '';
+        $this->appendBits($this->baseStart, $this->baseMask, $bits);
+        return SubnetTree::encodeDivision($bits);
+    }
+
+    private function appendBits($start, $mask, &$bits) {
+        if ($mask >= 32 || ($this->leaves[$start] ?? null) === $mask) {
+            $bits .= '0';
+            return;
+        }
+        $bits .= '1';
+        $this->appendBits($start, $mask + 1, $bits);
+        $this->appendBits($start + (1 << (31 - $mask)), $mask + 1, $bits);
+    }
+
+    private function addFree($start, $mask) {
+        if (!isset($this->free[$mask])) {
+            $this->free[$mask] = new SplMinHeap();
+        }
+        $this->free[$mask]->insert($start);
+    }
+}
+?>
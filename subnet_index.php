@@ -0,0 +1,524 @@
+<?php
+/**
+ * Subnet Lookup Index
+ * Maintains the subnet_entries table: one row per subnet node with its
+ * numeric address range, so IP searches never decode division_data
+ */
+
+require_once __DIR__ . '/subnet_tree.php';
+
+class SubnetIndex {
+    const INSERT_BATCH_SIZE = 500;
+    const VLAN_NAME_LENGTH = 255;
+    const SWEEP_BATCH_SIZE = 1000;
+
+    // Blocks of the conflict sweep: table, owner, start, end, mask and VLAN columns, row filter
+    const CONFLICT_SOURCES = [
+        'network' => ['subnet_configurations', 'id', 'net_start', 'net_end', 'mask_bits', 'NULL', 'NULL', 'net_start IS NOT NULL'],
+        'subnet' => ['subnet_entries', 'config_id', 'start_ip', 'end_ip', 'mask', 'vlan_id', 'vlan_name', 'is_leaf = 1']
+    ];
+
+    private $db;
+
+    public function __construct(PDO $db) {
+        $this->db = $db;
+    }
+
+    /**
+     * Replace the indexed entries and VLAN search text of one configuration
+     * Callers are expected to wrap this in the transaction that saves the configuration
+     */
+    public function rebuild($configId, $networkAddress, $divisionData, $vlanIds, $vlanNames) {
+        $this->rebuildMany([[
+            'id' => $configId,
+            'network_address' => $networkAddress,
+            'division_data' => $divisionData,
+            'vlan_ids' => $vlanIds,
+            'vlan_names' => $vlanNames
+        ]]);
+    }
+
+    /**
+     * Rebuild several configurations given as rows with id, network_address,
+     * division_data, vlan_ids and vlan_names
+     *
+     * Entries of consecutive configurations share the same multi-row INSERTs.
+     * VLAN assignments are synced row by row rather than rewritten, and the
+     * configuration's utilization columns are refreshed from the same walk.
+     */
+    public function rebuildMany(array $configs) {
+        foreach (array_chunk(array_column($configs, 'id'), self::INSERT_BATCH_SIZE) as $ids) {
+            $stmt = $this->db->prepare(
+                "DELETE FROM subnet_entries WHERE config_id IN (" . implode(',', array_fill(0, count($ids), '?')) . ")"
+            );
+            $stmt->execute($ids);
+        }
+
+        // Decoded VLAN names and IDs feed the configuration's full-text index
+        $updateConfig = $this->db->prepare(
+            "UPDATE subnet_configurations
+             SET vlan_text = ?, leaf_count = ?, allocated_leaves = ?, allocated_addresses = ?,
+                 free_addresses = ?, largest_free_mask = ?, updated_at = updated_at
+             WHERE id = ?"
+        );
+
+        $rows = [];
+        $vlans = [];
+        foreach ($configs as $config) {
+            $vlans[$config['id']] = [];
+            $searchTerms = [];
+            $stats = new SubnetStats();
+            foreach (SubnetTree::walk($config['network_address'], $config['division_data'], $config['vlan_ids'], $config['vlan_names']) as $node) {
+                $stats->add($node);
+                if ($node['vlanName'] !== '') {
+                    $searchTerms[$node['vlanName']] = true;
+                }
+                if ($node['vlanId'] !== null) {
+                    $searchTerms[$node['vlanId']] = true;
+                }
+                $rows[] = [
+                    $config['id'],
+                    $node['start'],
+                    $node['end'],
+                    $node['mask'],
+                    $node['vlanId'],
+                    $node['vlanName'] !== '' ? $node['vlanName'] : null,
+                    $node['isLeaf'] ? 1 : 0
+                ];
+                if ($node['vlanId'] !== null || $node['vlanName'] !== '') {
+                    $vlans[$config['id']][SubnetTree::nodeKey($node['start'], $node['mask'])] = [
+                        $node['start'],
+                        $node['mask'],
+                        $node['vlanId'],
+                        $node['vlanName'] !== '' ? mb_substr($node['vlanName'], 0, self::VLAN_NAME_LENGTH) : null
+                    ];
+                }
+                if (count($rows) >= self::INSERT_BATCH_SIZE) {
+                    $this->insertEntries($rows);
+                    $rows = [];
+                }
+            }
+            $updateConfig->execute([
+                implode("\n", array_keys($searchTerms)),
+                $stats->leaves,
+                $stats->allocatedLeaves,
+                $stats->allocatedAddresses,
+                $stats->freeAddresses,
+                $stats->largestFreeMask,
+                $config['id']
+            ]);
+        }
+        if ($rows) {
+            $this->insertEntries($rows);
+        }
+        $this->syncVlans($vlans);
+        $this->dropStaleBitmaps(array_keys($vlans));
+    }
+
+    /**
+     * Delete host occupancy bitsets of subnets that are no longer leaves;
+     * HostRegistry rebuilds them from the host rows when next needed. Host
+     * rows are never deleted here: callers reject a reshape that would
+     * leave one without a usable address (HostRegistry::orphans()).
+     */
+    private function dropStaleBitmaps(array $configIds) {
+        foreach (array_chunk($configIds, self::INSERT_BATCH_SIZE) as $ids) {
+            $placeholders = implode(',', array_fill(0, count($ids), '?'));
+            $stmt = $this->db->prepare(
+                "DELETE b FROM host_bitmaps b
+                 LEFT JOIN subnet_entries e
+                   ON e.config_id = b.config_id AND e.start_ip = b.start_ip AND e.mask = b.mask AND e.is_leaf = 1
+                 WHERE b.config_id IN ($placeholders) AND e.config_id IS NULL"
+            );
+            $stmt->execute($ids);
+        }
+    }
+
+    /**
+     * Bring subnet_vlans in line with [configId => [nodeKey => [start, mask, vlanId, vlanName]]]
+     *
+     * Only rows that appeared, changed or disappeared are written.
+     */
+    private function syncVlans(array $vlans) {
+        $existing = [];
+        $sites = [];
+        foreach (array_chunk(array_keys($vlans), self::INSERT_BATCH_SIZE) as $ids) {
+            $placeholders = implode(',', array_fill(0, count($ids), '?'));
+            $stmt = $this->db->prepare("SELECT config_id, start_ip, mask, vlan_id, vlan_name FROM subnet_vlans WHERE config_id IN ($placeholders)");
+            $stmt->execute($ids);
+            while ($row = $stmt->fetch(PDO::FETCH_ASSOC)) {
+                $existing[$row['config_id']][SubnetTree::nodeKey((int)$row['start_ip'], (int)$row['mask'])] =
+                    [$row['vlan_id'] === null ? null : (int)$row['vlan_id'], $row['vlan_name']];
+            }
+            $stmt = $this->db->prepare("SELECT id, site_name FROM subnet_configurations WHERE id IN ($placeholders)");
+            $stmt->execute($ids);
+            $sites += $stmt->fetchAll(PDO::FETCH_KEY_PAIR);
+        }
+
+        $upserts = [];
+        $deletes = [];
+        foreach ($vlans as $configId => $assignments) {
+            foreach ($assignments as $key => list($start, $mask, $vlanId, $vlanName)) {
+                if (($existing[$configId][$key] ?? false) !== [$vlanId, $vlanName]) {
+                    $upserts[] = [$configId, $start, $mask, $sites[$configId] ?? '', $vlanId, $vlanName];
+                }
+            }
+            foreach (array_keys(array_diff_key($existing[$configId] ?? [], $assignments)) as $key) {
+                $deletes[] = [$configId, $key >> 6, $key & 63];
+            }
+        }
+
+        foreach (array_chunk($deletes, self::INSERT_BATCH_SIZE) as $batch) {
+            $stmt = $this->db->prepare(
+                "DELETE FROM subnet_vlans WHERE (config_id, start_ip, mask) IN (" . implode(',', array_fill(0, count($batch), '(?, ?, ?)')) . ")"
+            );
+            $stmt->execute(array_merge(...$batch));
+        }
+        foreach (array_chunk($upserts, self::INSERT_BATCH_SIZE) as $batch) {
+            $stmt = $this->db->prepare(
+                "INSERT INTO subnet_vlans (config_id, start_ip, mask, site_name, vlan_id, vlan_name)
+                 VALUES " . implode(',', array_fill(0, count($batch), '(?, ?, ?, ?, ?, ?)')) . "
+                 ON DUPLICATE KEY UPDATE site_name = VALUES(site_name), vlan_id = VALUES(vlan_id), vlan_name = VALUES(vlan_name)"
+            );
+            $stmt->execute(array_merge(...$batch));
+        }
+    }
+
+    /**
+     * Every subnet using a VLAN ID or name, by site then address
+     */
+    public function vlanUsage($vlanId = null, $vlanName = null) {
+        $where = $vlanId !== null ? 'v.vlan_id = ?' : 'v.vlan_name = ?';
+        $stmt = $this->db->prepare(
+            "SELECT c.id, c.site_name, c.admin_number, c.network_address, v.start_ip, v.mask, v.vlan_id, v.vlan_name
+             FROM subnet_vlans v
+             JOIN subnet_configurations c ON c.id = v.config_id
+             WHERE $where
+             ORDER BY v.site_name, v.start_ip, v.mask"
+        );
+        $stmt->execute([$vlanId !== null ? $vlanId : $vlanName]);
+        return $stmt->fetchAll(PDO::FETCH_ASSOC);
+    }
+
+    /**
+     * Unused VLAN IDs of a site as [first, last] ranges within 1..4094
+     */
+    public function freeVlanRanges($siteName) {
+        $stmt = $this->db->prepare(
+            "SELECT DISTINCT vlan_id FROM subnet_vlans
+             WHERE site_name = ? AND vlan_id IS NOT NULL
+             ORDER BY vlan_id"
+        );
+        $stmt->execute([$siteName]);
+
+        $ranges = [];
+        $next = 1;
+        foreach ($stmt->fetchAll(PDO::FETCH_COLUMN) as $used) {
+            $used = (int)$used;
+            if ($used > $next) {
+                $ranges[] = [$next, $used - 1];
+            }
+            $next = max($next, $used + 1);
+        }
+        if ($next <= 4094) {
+            $ranges[] = [$next, 4094];
+        }
+        return $ranges;
+    }
+
+    public function remove($configId) {
+        $stmt = $this->db->prepare("DELETE FROM subnet_entries WHERE config_id = ?");
+        $stmt->execute([$configId]);
+    }
+
+    /**
+     * Find every indexed subnet containing an IP address, most specific first
+     *
+     * A block of prefix length m can only contain the IP if it starts at
+     * ip & mask(m), so the search is at most 33 point lookups on start_ip.
+     */
+    public function lookup($ip) {
+        $ipLong = ip2long($ip);
+        if ($ipLong === false) {
+            return [];
+        }
+
+        $starts = SubnetTree::containingStarts($ipLong, 32);
+        $placeholders = implode(',', array_fill(0, count($starts), '?'));
+
+        $stmt = $this->db->prepare(
+            "SELECT c.id, c.site_name, c.admin_number, c.network_address, c.created_at,
+                    e.start_ip, e.mask, e.vlan_id, e.vlan_name, e.is_leaf
+             FROM subnet_entries e
+             JOIN subnet_configurations c ON c.id = e.config_id
+             WHERE e.start_ip IN ($placeholders) AND e.end_ip >= ?
+             ORDER BY e.mask DESC, c.created_at DESC"
+        );
+        $stmt->execute(array_merge($starts, [$ipLong]));
+
+        return $stmt->fetchAll(PDO::FETCH_ASSOC);
+    }
+
+    /**
+     * Resolve many IP addresses in one merge pass over the sorted entries
+     *
+     * $ips must be unsigned integers sorted ascending without duplicates.
+     * Yields ip => matching entries, least specific first. CIDR blocks either
+     * nest or are disjoint, so the blocks open at any address form a stack.
+     * Entries are read in keyset batches, so the connection is free for
+     * other queries between two yields.
+     */
+    public function lookupMany(array $ips) {
+        $count = count($ips);
+        if ($count === 0) {
+            return;
+        }
+
+        $select = "SELECT config_id, start_ip, end_ip, mask, vlan_id, vlan_name, is_leaf
+                   FROM subnet_entries
+                   WHERE start_ip <= ? AND end_ip >= ?";
+        $order = " ORDER BY start_ip ASC, end_ip DESC, config_id ASC LIMIT " . self::SWEEP_BATCH_SIZE;
+
+        $stack = [];
+        $i = 0;
+        $after = null;
+        while ($i < $count) {
+            if ($after === null) {
+                $stmt = $this->db->prepare($select . $order);
+                $stmt->execute([$ips[$count - 1], $ips[0]]);
+            } else {
+                $stmt = $this->db->prepare(
+                    $select . " AND start_ip >= ?
+                      AND (start_ip > ? OR (start_ip = ? AND (end_ip < ? OR (end_ip = ? AND config_id > ?))))" . $order
+                );
+                $stmt->execute([$ips[$count - 1], $ips[0], $after[0], $after[0], $after[0], $after[1], $after[1], $after[2]]);
+            }
+            $entries = $stmt->fetchAll(PDO::FETCH_ASSOC);
+
+            foreach ($entries as $entry) {
+                $start = (int)$entry['start_ip'];
+
+                // Every address before this block sees only the blocks already open
+                while ($i < $count && $ips[$i] < $start) {
+                    $ip = $ips[$i++];
+                    while ($stack && end($stack)['end_ip'] < $ip) {
+                        array_pop($stack);
+                    }
+                    yield $ip => $stack;
+                }
+                if ($i === $count) {
+                    return;
+                }
+
+                while ($stack && end($stack)['end_ip'] < $start) {
+                    array_pop($stack);
+                }
+                $entry['end_ip'] = (int)$entry['end_ip'];
+                $stack[] = $entry;
+            }
+
+            if (count($entries) < self::SWEEP_BATCH_SIZE) {
+                break;
+            }
+            $last = end($entries);
+            $after = [(int)$last['start_ip'], (int)$last['end_ip'], (int)$last['config_id']];
+        }
+
+        while ($i < $count) {
+            $ip = $ips[$i++];
+            while ($stack && end($stack)['end_ip'] < $ip) {
+                array_pop($stack);
+            }
+            yield $ip => $stack;
+        }
+    }
+
+    /**
+     * Every overlapping pair of parent networks, then of leaf subnets,
+     * belonging to different configurations, in address order
+     *
+     * Each kind is one sweep over blocks sorted by (start ASC, end DESC, owner):
+     * the blocks still open when a block starts all contain it. Yields
+     * cursor => conflict; passing a yielded cursor back resumes right after
+     * that conflict. The sweep stack is then rebuilt from the blocks
+     * containing the resume point, and blocks are read in keyset batches, so
+     * a page costs the blocks it covers rather than a full pass.
+     */
+    public function findConflicts(?array $cursor = null) {
+        $configs = [];
+        $resume = $cursor;
+        foreach (self::CONFLICT_SOURCES as $type => $source) {
+            if ($resume !== null && $resume[0] !== $type) {
+                continue;
+            }
+            foreach ($this->sweep($type, $source, $resume) as $position => $pair) {
+                yield $position => $this->describeConflict($type, $pair, $configs);
+            }
+            $resume = null;
+        }
+    }
+
+    /**
+     * Yield [type, start, end, owner, n] => [outer, inner] for every block
+     * contained in an open block of another configuration, n counting the
+     * pairs of the block so far
+     */
+    private function sweep($type, array $source, ?array $resume = null) {
+        list($table, $owner, $startColumn, $endColumn, $maskColumn, $vlanIdColumn, $vlanNameColumn, $filter) = $source;
+        $select = "SELECT $owner AS config_id, $startColumn AS start_ip, $endColumn AS end_ip, $maskColumn AS mask,
+                          $vlanIdColumn AS vlan_id, $vlanNameColumn AS vlan_name
+                   FROM $table WHERE $filter";
+        $order = " ORDER BY $startColumn, $endColumn DESC, $owner";
+        $normalize = function (array $block) {
+            $block['config_id'] = (int)$block['config_id'];
+            $block['start_ip'] = (int)$block['start_ip'];
+            $block['end_ip'] = (int)$block['end_ip'];
+            return $block;
+        };
+
+        $stack = [];
+        $after = null;
+        $skip = 0;
+        if ($resume !== null) {
+            // Blocks are nested or disjoint, so the open stack is every earlier block containing the resume point
+            list(, $start, $end, $id, $skip) = $resume;
+            $containing = SubnetTree::containingStarts($start, 32);
+            $stmt = $this->db->prepare(
+                $select . " AND $startColumn IN (" . implode(',', array_fill(0, count($containing), '?')) . ") AND $endColumn >= ?" . $order
+            );
+            $stmt->execute(array_merge($containing, [$start]));
+            foreach ($stmt->fetchAll(PDO::FETCH_ASSOC) as $block) {
+                $block = $normalize($block);
+                if ([$block['start_ip'], -$block['end_ip'], $block['config_id']] < [$start, -$end, $id]) {
+                    $stack[] = $block;
+                }
+            }
+            $after = [$start, $end, $id, '>='];
+        }
+
+        while (true) {
+            if ($after === null) {
+                $stmt = $this->db->prepare($select . $order . " LIMIT " . self::SWEEP_BATCH_SIZE);
+                $stmt->execute();
+            } else {
+                // The leading range condition lets MySQL seek on the start column
+                $stmt = $this->db->prepare(
+                    $select . " AND $startColumn >= ?
+                      AND ($startColumn > ? OR ($startColumn = ? AND ($endColumn < ? OR ($endColumn = ? AND $owner {$after[3]} ?))))" .
+                    $order . " LIMIT " . self::SWEEP_BATCH_SIZE
+                );
+                $stmt->execute([$after[0], $after[0], $after[0], $after[1], $after[1], $after[2]]);
+            }
+            $blocks = $stmt->fetchAll(PDO::FETCH_ASSOC);
+
+            foreach ($blocks as $block) {
+                $block = $normalize($block);
+                while ($stack && end($stack)['end_ip'] < $block['start_ip']) {
+                    array_pop($stack);
+                }
+                // Pairs already returned for the resume block are skipped
+                $done = ($resume !== null && [$block['start_ip'], $block['end_ip'], $block['config_id']] === [$resume[1], $resume[2], $resume[3]]) ? $skip : 0;
+                $n = 0;
+                foreach ($stack as $open) {
+                    if ($open['config_id'] !== $block['config_id'] && ++$n > $done) {
+                        yield [$type, $block['start_ip'], $block['end_ip'], $block['config_id'], $n] => [$open, $block];
+                    }
+                }
+                $stack[] = $block;
+            }
+
+            if (count($blocks) < self::SWEEP_BATCH_SIZE) {
+                return;
+            }
+            $last = $normalize(end($blocks));
+            $after = [$last['start_ip'], $last['end_ip'], $last['config_id'], '>'];
+        }
+    }
+
+    /**
+     * Both sides of a pair with their configuration, loaded once per sweep into $configs
+     */
+    private function describeConflict($type, array $pair, array &$configs) {
+        $sides = [];
+        foreach ($pair as $block) {
+            if (!isset($configs[$block['config_id']])) {
+                $stmt = $this->db->prepare("SELECT id, site_name, admin_number, network_address FROM subnet_configurations WHERE id = ?");
+                $stmt->execute([$block['config_id']]);
+                $configs[$block['config_id']] = $stmt->fetch(PDO::FETCH_ASSOC);
+            }
+            $config = $configs[$block['config_id']];
+            $sides[] = [
+                'configId' => $config['id'],
+                'siteName' => $config['site_name'],
+                'adminNumber' => $config['admin_number'],
+                'networkAddress' => $config['network_address'],
+                'subnet' => long2ip($block['start_ip']) . '/' . $block['mask'],
+                'vlanId' => $block['vlan_id'] ?? '',
+                'vlanName' => $block['vlan_name'] ?? ''
+            ];
+        }
+        return ['type' => $type, 'outer' => $sides[0], 'inner' => $sides[1]];
+    }
+
+    private function insertEntries(array $rows) {
+        $placeholders = implode(',', array_fill(0, count($rows), '(?, ?, ?, ?, ?, ?, ?)'));
+        $stmt = $this->db->prepare(
+            "INSERT INTO subnet_entries
+             (config_id, start_ip, end_ip, mask, vlan_id, vlan_name, is_leaf)
+             VALUES $placeholders"
+        );
+        $stmt->execute(array_merge(...$rows));
+    }
+}
+
+/**
+ * Utilization of one configuration, accumulated over SubnetTree::walk()
+ *
+ * A leaf is allocated when it has a VLAN ID or a description. The largest
+ * free block is the shortest prefix whose leaves are all free.
+ */
+class SubnetStats {
+    public $leaves = 0;
+    public $allocatedLeaves = 0;
+    public $allocatedAddresses = 0;
+    public $freeAddresses = 0;
+    public $largestFreeMask = null;
+
+    // Divided nodes still waiting for leaves: [mask, allFree, childrenLeft]
+    private $open = [];
+
+    public function add(array $node) {
+        if (!$node['isLeaf']) {
+            $this->open[] = [$node['mask'], true, 2];
+            return;
+        }
+
+        $size = $node['end'] - $node['start'] + 1;
+        $free = $node['vlanId'] === null && $node['vlanName'] === '';
+        $this->leaves++;
+        if ($free) {
+            $this->freeAddresses += $size;
+        } else {
+            $this->allocatedLeaves++;
+            $this->allocatedAddresses += $size;
+        }
+
+        // Preorder: a completed node reports to its parent, which may complete in turn
+        $mask = $node['mask'];
+        while (true) {
+            if ($free && ($this->largestFreeMask === null || $mask < $this->largestFreeMask)) {
+                $this->largestFreeMask = $mask;
+            }
+            $top = count($this->open) - 1;
+            if ($top < 0) {
+                break;
+            }
+            $this->open[$top][1] = $this->open[$top][1] && $free;
+            if (--$this->open[$top][2] > 0) {
+                break;
+            }
+            list($mask, $free) = array_pop($this->open);
+        }
+    }
+}
+?>
@@ -0,0 +1,372 @@
+<?php
+/**
+ * Subnet Tree Helpers
+ * Decodes the division tree and VLAN strings saved by subnets.html
+ */
+
+class SubnetTree {
+    // Compact division format: prefix, then base64url of a mode byte and its payload
+    const DIVISION_V2_PREFIX = 'v2~';
+    const DIVISION_PACKED = 0;     // preorder bits, eight per byte, most significant first
+    const DIVISION_RLE = 1;        // varint lengths of alternating runs, starting with divided nodes
+    const MAX_DIVISION_NODES = 65535; // a /16 divided down to /31, whatever the network size
+
+    /**
+     * Decode a division string, v2 or legacy "len.hex", into packed preorder bits
+     *
+     * Bits past the end of the returned bytes are 0 (undivided), so trailing
+     * zero bytes may be missing. Returns false when the data is not a
+     * division string, or describes a tree of more than MAX_DIVISION_NODES
+     * nodes.
+     */
+    public static function decodeDivision($data) {
+        $data = (string)$data;
+        if (strncmp($data, self::DIVISION_V2_PREFIX, strlen(self::DIVISION_V2_PREFIX)) === 0) {
+            $bytes = base64_decode(strtr(substr($data, strlen(self::DIVISION_V2_PREFIX)), '-_', '+/'), true);
+            if ($bytes === false || $bytes === '') {
+                return false;
+            }
+            switch (ord($bytes[0])) {
+                case self::DIVISION_PACKED:
+                    return self::withinNodeLimit(substr($bytes, 1));
+                case self::DIVISION_RLE:
+                    // Encoded runs never go past the last node, so they share the limit
+                    $bytes = self::expandRuns(substr($bytes, 1), self::MAX_DIVISION_NODES);
+                    return $bytes === false ? false : self::withinNodeLimit($bytes);
+                default:
+                    return false;
+            }
+        }
+
+        // Legacy format: hex digits holding four bits each, least significant first
+        if (!preg_match('/([0-9]+)\.([0-9a-f]+)/', $data, $matches)) {
+            return false;
+        }
+        $hex = strtr(substr($matches[2], 0, intdiv(intval($matches[1]) + 3, 4)), '0123456789abcdef', '084c2a6e195d3b7f');
+        return self::withinNodeLimit(hex2bin(strlen($hex) % 2 ? $hex . '0' : $hex));
+    }
+
+    /**
+     * Return $bytes, or false when the preorder tree they describe has more
+     * than MAX_DIVISION_NODES nodes. Every divided node opens one more
+     * pending child, every undivided one closes one.
+     */
+    private static function withinNodeLimit($bytes) {
+        $pending = 1;
+        $nodes = 0;
+        $length = strlen($bytes) * 8;
+        for ($position = 0; $position < $length && $pending > 0; $position++) {
+            $pending += ((ord($bytes[$position >> 3]) >> (7 - ($position & 7))) & 1) ? 1 : -1;
+            if (++$nodes > self::MAX_DIVISION_NODES) {
+                return false;
+            }
+        }
+        // Missing bits are undivided leaves
+        return $nodes + $pending > self::MAX_DIVISION_NODES ? false : $bytes;
+    }
+
+    /**
+     * Encode a '0'/'1' preorder string in the v2 format, packed or run-length
+     * encoded, whichever is shorter
+     */
+    public static function encodeDivision($bits) {
+        $packed = rtrim(self::packBits($bits), "\0");
+
+        // Trailing undivided nodes are implied, so the last run of zeros is dropped
+        $runs = '';
+        $length = strlen(rtrim($bits, '0'));
+        for ($position = 0, $char = '1'; $position < $length; $char = $char === '1' ? '0' : '1') {
+            $run = strspn($bits, $char, $position, $length - $position);
+            $runs .= self::varint($run);
+            $position += $run;
+        }
+
+        $payload = strlen($runs) < strlen($packed)
+            ? chr(self::DIVISION_RLE) . $runs
+            : chr(self::DIVISION_PACKED) . $packed;
+        return self::DIVISION_V2_PREFIX . rtrim(strtr(base64_encode($payload), '+/', '-_'), '=');
+    }
+
+    private static function packBits($bits) {
+        static $nibbles = null;
+        if ($nibbles === null) {
+            for ($i = 0; $i < 16; $i++) {
+                $nibbles[sprintf('%04b', $i)] = dechex($i);
+            }
+        }
+        $padded = str_pad($bits, (int)ceil(strlen($bits) / 8) * 8, '0');
+        return hex2bin(strtr($padded, $nibbles));
+    }
+
+    /**
+     * Write varint run lengths straight into packed bytes, or return false
+     * once they add up to more than $maxBits: a few bytes of runs must not
+     * expand into gigabytes
+     */
+    private static function expandRuns($runs, $maxBits) {
+        $bytes = '';
+        $partial = 0;   // bits of the unfinished last byte, most significant first
+        $used = 0;      // how many bits of it are written
+        $total = 0;
+        $length = strlen($runs);
+        for ($position = 0, $divided = true; $position < $length; $divided = !$divided) {
+            $run = 0;
+            $shift = 0;
+            do {
+                $byte = ord($runs[$position++]);
+                $run |= ($byte & 0x7f) << $shift;
+                $shift += 7;
+            } while (($byte & 0x80) && $position < $length && $shift < 35);
+
+            $total += $run;
+            if ($total > $maxBits) {
+                return false;
+            }
+
+            // Complete the unfinished byte, then whole bytes, then start the next one
+            if ($used > 0) {
+                $take = min($run, 8 - $used);
+                if ($divided) {
+                    $partial |= (0xFF >> $used) & (0xFF << (8 - $used - $take));
+                }
+                $used += $take;
+                $run -= $take;
+                if ($used === 8) {
+                    $bytes .= chr($partial & 0xFF);
+                    $partial = 0;
+                    $used = 0;
+                }
+            }
+            if ($run > 0) {
+                $bytes .= str_repeat($divided ? "\xFF" : "\0", $run >> 3);
+                $used = $run & 7;
+                $partial = $divided ? (0xFF << (8 - $used)) & 0xFF : 0;
+            }
+        }
+        return $used > 0 ? $bytes . chr($partial) : $bytes;
+    }
+
+    private static function varint($value) {
+        $out = '';
+        while ($value >= 0x80) {
+            $out .= chr(($value & 0x7f) | 0x80);
+            $value >>= 7;
+        }
+        return $out . chr($value);
+    }
+
+    /**
+     * Build the division tree and VLAN strings whose leaves include the given subnets
+     *
+     * $leaves holds "x.x.x.x/m" strings or ['subnet', 'vlanId', 'vlanName'] arrays.
+     * Address space not covered by a listed subnet stays undivided. Returns
+     * ['divisionData', 'vlanIds', 'vlanNames'], or null when a subnet is invalid,
+     * outside the network or overlaps another one.
+     */
+    public static function fromLeaves($networkAddress, array $leaves) {
+        $base = self::networkRange($networkAddress);
+        if ($base === null) {
+            return null;
+        }
+
+        $blocks = [];
+        $vlanIds = '';
+        $vlanNames = '';
+        foreach ($leaves as $leaf) {
+            $range = self::networkRange((string)(is_array($leaf) ? ($leaf['subnet'] ?? '') : $leaf));
+            if ($range === null || $range[0] < $base[0] || $range[1] > $base[1]) {
+                return null;
+            }
+            $blocks[] = $range;
+
+            $key = long2ip($range[0]) . '/' . $range[2];
+            if (is_array($leaf) && (string)($leaf['vlanId'] ?? '') !== '') {
+                $vlanIds .= $key . ':' . rawurlencode((string)$leaf['vlanId']) . ';';
+            }
+            if (is_array($leaf) && (string)($leaf['vlanName'] ?? '') !== '') {
+                $vlanNames .= $key . ':' . rawurlencode((string)$leaf['vlanName']) . ';';
+            }
+        }
+
+        // Sorted by (start ASC, end DESC) the leaves appear in tree preorder
+        usort($blocks, function ($a, $b) {
+            return [$a[0], $b[1]] <=> [$b[0], $a[1]];
+        });
+
+        $bits = '';
+        $next = 0;
+        if (!self::appendLeafBits($base[0], $base[2], $blocks, $next, $bits) || $next < count($blocks)) {
+            return null;
+        }
+
+        return [
+            'divisionData' => self::encodeDivision($bits),
+            'vlanIds' => $vlanIds,
+            'vlanNames' => $vlanNames
+        ];
+    }
+
+    private static function appendLeafBits($start, $mask, array $blocks, &$next, &$bits) {
+        $end = $start + (1 << (32 - $mask)) - 1;
+        if ($next >= count($blocks) || $blocks[$next][0] > $end) {
+            $bits .= '0'; // Nothing listed inside: undivided free block
+            return true;
+        }
+
+        if ($blocks[$next][0] === $start && $blocks[$next][2] === $mask) {
+            $bits .= '0';
+            $next++;
+            // A further subnet inside this leaf overlaps it
+            return $next >= count($blocks) || $blocks[$next][0] > $end;
+        }
+
+        if ($mask >= 32) {
+            return false;
+        }
+        $bits .= '1';
+        $half = 1 << (31 - $mask);
+        return self::appendLeafBits($start, $mask + 1, $blocks, $next, $bits)
+            && self::appendLeafBits($start + $half, $mask + 1, $blocks, $next, $bits);
+    }
+
+    /**
+     * Parse a "subnet:value;subnet:value;" string into [nodeKey => value]
+     *
+     * Subnets are parsed once into integer keys so tree walks never build
+     * "x.x.x.x/m" strings.
+     */
+    public static function parseVlanString($str) {
+        $values = [];
+        if (empty($str)) {
+            return $values;
+        }
+
+        foreach (explode(';', $str) as $entry) {
+            $parts = explode(':', trim($entry), 2);
+            if (count($parts) !== 2 || $parts[0] === '') {
+                continue; // Skip empty or malformed entries
+            }
+            $subnet = explode('/', $parts[0], 2);
+            $start = ip2long($subnet[0]);
+            if ($start === false || count($subnet) !== 2 || !ctype_digit($subnet[1]) || (int)$subnet[1] > 32) {
+                continue;
+            }
+            $values[self::nodeKey($start, (int)$subnet[1])] = urldecode($parts[1]);
+        }
+
+        return $values;
+    }
+
+    /**
+     * Integer key of the node starting at $start with prefix length $mask
+     */
+    public static function nodeKey($start, $mask) {
+        return ($start << 6) | $mask;
+    }
+
+    /**
+     * Walk every node of a saved configuration in preorder
+     *
+     * Yields ['start', 'end', 'mask', 'isLeaf', 'vlanId', 'vlanName'] with
+     * start/end as unsigned integers.
+     */
+    public static function walk($networkAddress, $divisionData, $vlanIds = '', $vlanNames = '') {
+        $range = self::networkRange($networkAddress);
+        if ($range === null) {
+            return;
+        }
+        list($baseStart, , $baseMask) = $range;
+
+        $ids = self::parseVlanString($vlanIds);
+        $names = self::parseVlanString($vlanNames);
+
+        // An undecodable tree is treated as the undivided base network
+        $bytes = $divisionData ? self::decodeDivision($divisionData) : false;
+        if ($bytes === false) {
+            $bytes = '';
+        }
+
+        // Bits are read straight from the packed bytes
+        $position = 0;
+        $length = strlen($bytes) * 8;
+        $stack = [[$baseStart, $baseMask]];
+
+        while ($stack) {
+            list($start, $mask) = array_pop($stack);
+            $divided = $position < $length && ((ord($bytes[$position >> 3]) >> (7 - ($position & 7))) & 1) && $mask < 32;
+            $position++;
+
+            $key = self::nodeKey($start, $mask);
+            $vlanId = $ids[$key] ?? '';
+            $vlanId = is_numeric($vlanId) ? intval($vlanId) : 0;
+            yield [
+                'start' => $start,
+                'end' => $start + (1 << (32 - $mask)) - 1,
+                'mask' => $mask,
+                'isLeaf' => !$divided,
+                'vlanId' => ($vlanId >= 1 && $vlanId <= 4094) ? $vlanId : null,
+                'vlanName' => $names[$key] ?? ''
+            ];
+
+            if ($divided) {
+                // Push the right half first so the left half is visited next
+                $stack[] = [$start + (1 << (31 - $mask)), $mask + 1];
+                $stack[] = [$start, $mask + 1];
+            }
+        }
+    }
+
+    /**
+     * Longest prefix with at least $hosts useable addresses, counted as the
+     * calculator does (/32 has 1, /31 has 2); null when no prefix is large enough
+     */
+    public static function prefixForHosts($hosts) {
+        if ($hosts <= 2) {
+            return $hosts <= 1 ? 32 : 31;
+        }
+        for ($mask = 30; $mask >= 0; $mask--) {
+            if ((1 << (32 - $mask)) - 2 >= $hosts) {
+                return $mask;
+            }
+        }
+        return null;
+    }
+
+    /**
+     * Numeric [start, end, mask] range of an "x.x.x.x/m" network, or null
+     */
+    public static function networkRange($networkAddress) {
+        $parts = explode('/', $networkAddress);
+        if (count($parts) !== 2) {
+            return null;
+        }
+
+        $mask = intval($parts[1]);
+        $ipLong = ip2long($parts[0]);
+        if ($ipLong === false || $mask < 0 || $mask > 32) {
+            return null;
+        }
+
+        $start = $ipLong & self::maskToLong($mask);
+        return [$start, $start + (1 << (32 - $mask)) - 1, $mask];
+    }
+
+    /**
+     * Start addresses of every block of prefix length 0..$mask containing $start
+     */
+    public static function containingStarts($start, $mask) {
+        $starts = [];
+        for ($bits = 0; $bits <= $mask; $bits++) {
+            $starts[$start & self::maskToLong($bits)] = true;
+        }
+        return array_keys($starts);
+    }
+
+    /**
+     * Network mask for a prefix length as an unsigned integer
+     */
+    public static function maskToLong($maskBits) {
+        return (0xFFFFFFFF << (32 - $maskBits)) & 0xFFFFFFFF;
+    }
+}
+?>
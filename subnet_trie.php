@@ -0,0 +1,308 @@
+<?php
+/**
+ * Shared IP-to-subnet Binary Trie
+ * One node per address bit of every indexed subnet, cached node by node in
+ * APCu (or in an opcache-compiled PHP file in a private directory) and
+ * rebuilt lazily when the global data version changes. A lookup reads only
+ * the nodes on its path, at most 33.
+ */
+
+require_once __DIR__ . '/subnet_tree.php';
+
+class SubnetTrie {
+    const CACHE_KEY = 'subnets_trie';
+    const VERSION_KEY = 'subnets_data_version';
+    const LOCK_TTL = 30;
+    // Longest time writes from another server or the CLI take to be noticed
+    const VERSION_TTL = 5;
+
+    private $db;
+    private $cacheDir;
+    private $file = null;  // Items of the included cache file, with their version
+
+    public function __construct(PDO $db, $cacheDir = null) {
+        $this->db = $db;
+        $this->cacheDir = $cacheDir ?: (getenv('SUBNET_CACHE_DIR') ?: sys_get_temp_dir() . '/subnet-calculator-trie');
+    }
+
+    /**
+     * Current global data version, bumped by every configuration change
+     */
+    public static function currentVersion(PDO $db) {
+        $stmt = $db->query("SELECT version FROM data_version WHERE id = 1");
+        return (int)$stmt->fetchColumn();
+    }
+
+    /**
+     * Increment the global data version inside the caller's transaction,
+     * stamping it on the changed configurations as their row_version;
+     * returns the new version
+     *
+     * The data_version row stays locked until commit, so versions are
+     * handed out in commit order and can serve as a change-feed cursor.
+     * The APCu copy of the version is refreshed once the request is over,
+     * when the transaction has been committed or rolled back.
+     */
+    public static function bumpVersion(PDO $db, array $configIds = []) {
+        $db->exec("UPDATE data_version SET version = version + 1 WHERE id = 1");
+        $version = self::currentVersion($db);
+        foreach (array_chunk($configIds, 1000) as $ids) {
+            $stmt = $db->prepare(
+                "UPDATE subnet_configurations SET row_version = ?, updated_at = updated_at
+                 WHERE id IN (" . implode(',', array_fill(0, count($ids), '?')) . ")"
+            );
+            $stmt->execute(array_merge([$version], $ids));
+        }
+
+        static $registered = false;
+        if (!$registered && self::apcuAvailable()) {
+            $registered = true;
+            register_shutdown_function(function () use ($db) {
+                if ($db->inTransaction()) {
+                    apcu_delete(self::VERSION_KEY);
+                } else {
+                    apcu_store(self::VERSION_KEY, self::currentVersion($db), self::VERSION_TTL);
+                }
+            });
+        }
+        return $version;
+    }
+
+    /**
+     * Longest-prefix match: every subnet containing the IP, most specific first
+     *
+     * Returns null when no cached trie is available (being rebuilt by
+     * another request, or no private cache) so the caller can fall back to
+     * the SQL index.
+     */
+    public function lookup($ip) {
+        $ipLong = ip2long($ip);
+        if ($ipLong === false) {
+            return [];
+        }
+
+        $version = $this->version();
+        if (!$this->ready($version)) {
+            return null;
+        }
+
+        $matches = [];
+        $node = 0;
+        for ($depth = 0; ; $depth++) {
+            $current = $this->fetch($version, 'n' . $node);
+            if ($current === null) {
+                return $this->evicted($version);
+            }
+            if ($current[2]) {
+                $start = $ipLong & SubnetTree::maskToLong($depth);
+                foreach ($current[2] as $entry) {
+                    $config = $this->fetch($version, 'c' . $entry[0]);
+                    if ($config === null) {
+                        return $this->evicted($version);
+                    }
+                    $matches[] = [
+                        'configId' => $entry[0],
+                        'siteName' => $config[0],
+                        'adminNumber' => $config[1],
+                        'networkAddress' => $config[2],
+                        'subnet' => long2ip($start) . '/' . $depth,
+                        'vlanId' => $entry[1] ?? '',
+                        'vlanName' => $entry[2] ?? '',
+                        'isLeaf' => (bool)$entry[3],
+                        'createdAt' => $config[3]
+                    ];
+                }
+            }
+            if ($depth === 32) {
+                break;
+            }
+            $child = $current[($ipLong >> (31 - $depth)) & 1];
+            if ($child === null) {
+                break;
+            }
+            $node = $child;
+        }
+
+        return array_reverse($matches);
+    }
+
+    /**
+     * Data version from APCu, read from the database only when it expired
+     * (on every lookup without APCu)
+     */
+    private function version() {
+        if (self::apcuAvailable()) {
+            $version = apcu_fetch(self::VERSION_KEY);
+            if ($version !== false) {
+                return $version;
+            }
+            $version = self::currentVersion($this->db);
+            apcu_add(self::VERSION_KEY, $version, self::VERSION_TTL);
+            return $version;
+        }
+        return self::currentVersion($this->db);
+    }
+
+    /**
+     * Make sure the trie of $version is cached; false when it cannot be
+     */
+    private function ready($version) {
+        if (self::apcuAvailable()) {
+            if (apcu_exists($this->key($version, 'built'))) {
+                return true;
+            }
+            // Only one request builds a given version, the others use SQL meanwhile
+            if (!apcu_add(self::CACHE_KEY . '_lock', $version, self::LOCK_TTL)) {
+                return false;
+            }
+            $items = [];
+            foreach ($this->build() as $name => $value) {
+                $items[$this->key($version, $name)] = $value;
+            }
+            $failed = apcu_store($items);
+            if (!$failed) {
+                apcu_store($this->key($version, 'built'), true);
+                // Drop the nodes of every older version
+                apcu_delete(new APCUIterator('/^' . self::CACHE_KEY . '_v(?!' . $version . '_)/', APC_ITER_KEY));
+            }
+            apcu_delete(self::CACHE_KEY . '_lock');
+            return !$failed;
+        }
+
+        if ($this->file !== null && $this->file[0] === $version) {
+            return true;
+        }
+        $dir = $this->privateCacheDir();
+        if ($dir === null) {
+            return false;
+        }
+        $file = $dir . '/' . self::CACHE_KEY . '_v' . $version . '.php';
+        if (is_file($file)) {
+            $items = include $file;
+            if (is_array($items)) {
+                $this->file = [$version, $items];
+                return true;
+            }
+        }
+
+        $lock = $file . '.lock';
+        if (is_file($lock) && filemtime($lock) < time() - self::LOCK_TTL) {
+            @unlink($lock); // Stale lock left by a request that died mid-build
+        }
+        $handle = @fopen($lock, 'x');
+        if ($handle === false) {
+            return false;
+        }
+        fclose($handle);
+
+        $items = $this->build();
+        $tmp = $file . '.' . getmypid() . '.tmp';
+        if (@file_put_contents($tmp, '<?php return ' . var_export($items, true) . ';') !== false) {
+            rename($tmp, $file);
+            foreach (glob($dir . '/' . self::CACHE_KEY . '_v*.php') ?: [] as $old) {
+                if ($old !== $file) {
+                    @unlink($old);
+                }
+            }
+        }
+        @unlink($lock);
+        $this->file = [$version, $items];
+        return true;
+    }
+
+    /**
+     * Flat cache items: 'n<node>' => [left child, right child, entries]
+     * and 'c<config id>' => [site, admin number, network, created at]
+     */
+    private function build() {
+        $items = [];
+
+        $stmt = $this->db->query(
+            "SELECT id, site_name, admin_number, network_address, created_at FROM subnet_configurations"
+        );
+        foreach ($stmt->fetchAll(PDO::FETCH_ASSOC) as $config) {
+            $items['c' . $config['id']] = [$config['site_name'], $config['admin_number'], $config['network_address'], $config['created_at']];
+        }
+
+        $nodes = [[null, null, []]];
+        $stmt = $this->db->query(
+            "SELECT config_id, start_ip, mask, vlan_id, vlan_name, is_leaf
+             FROM subnet_entries
+             ORDER BY start_ip ASC, end_ip DESC"
+        );
+        while ($row = $stmt->fetch(PDO::FETCH_ASSOC)) {
+            $start = (int)$row['start_ip'];
+            $mask = (int)$row['mask'];
+
+            $node = 0;
+            for ($depth = 0; $depth < $mask; $depth++) {
+                $bit = ($start >> (31 - $depth)) & 1;
+                if ($nodes[$node][$bit] === null) {
+                    $nodes[$node][$bit] = count($nodes);
+                    $nodes[] = [null, null, []];
+                }
+                $node = $nodes[$node][$bit];
+            }
+            $nodes[$node][2][] = [(int)$row['config_id'], $row['vlan_id'], $row['vlan_name'], (int)$row['is_leaf']];
+        }
+
+        foreach ($nodes as $node => $value) {
+            $items['n' . $node] = $value;
+        }
+        return $items;
+    }
+
+    /**
+     * APCu dropped part of the trie: have the next request rebuild it
+     */
+    private function evicted($version) {
+        apcu_delete($this->key($version, 'built'));
+        return null;
+    }
+
+    private function fetch($version, $name) {
+        if (self::apcuAvailable()) {
+            $value = apcu_fetch($this->key($version, $name), $found);
+            return $found ? $value : null;
+        }
+        return $this->file[1][$name] ?? null;
+    }
+
+    private function key($version, $name) {
+        return self::CACHE_KEY . '_v' . $version . '_' . $name;
+    }
+
+    /**
+     * The cache directory, if it is a real directory owned by this process
+     * and closed to everyone else; a file anyone else could write would be
+     * executed by include. Without opcache every include would parse the
+     * whole trie, so there is no file cache then either.
+     */
+    private function privateCacheDir() {
+        if (!function_exists('posix_geteuid') || !self::opcacheEnabled()) {
+            return null;
+        }
+        if (!file_exists($this->cacheDir)) {
+            @mkdir($this->cacheDir, 0700, true);
+        }
+        clearstatcache(true, $this->cacheDir);
+        if (is_link($this->cacheDir) || !is_dir($this->cacheDir)) {
+            return null;
+        }
+        $stat = stat($this->cacheDir);
+        if ($stat === false || $stat['uid'] !== posix_geteuid() || ($stat['mode'] & 0077) !== 0) {
+            return null;
+        }
+        return $this->cacheDir;
+    }
+
+    private static function opcacheEnabled() {
+        return function_exists('opcache_get_status')
+            && filter_var(ini_get(PHP_SAPI === 'cli' ? 'opcache.enable_cli' : 'opcache.enable'), FILTER_VALIDATE_BOOLEAN);
+    }
+
+    private static function apcuAvailable() {
+        return function_exists('apcu_enabled') && apcu_enabled();
+    }
+}
+?>
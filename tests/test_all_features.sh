@@ -184,17 +184,422 @@ else
 fi
 echo ""
 
-# Test 13: Vérification images GIF
-echo "Test 13: Images GIF disponibles"
+# Test 13: Colonne Join dessinée sans images GIF
+echo "Test 13: Colonne Join sans images GIF"
 echo "-------------------------------------------"
-response=$(curl -s -o /dev/null -w "%{http_code}" "${API_URL}/img/24.gif")
-if [ "$response" = "200" ]; then
-  echo -e "${GREEN}✓ PASS${NC} - Images GIF accessibles"
+response=$(curl -s "${API_URL}/subnets.html")
+if echo "$response" | grep -q "drawJoinColumn" && ! echo "$response" | grep -q "img/"; then
+  echo -e "${GREEN}✓ PASS${NC} - Colonne Join dessinée sur canvas"
+else
+  echo -e "${RED}✗ FAIL${NC} - La page référence encore des images GIF"
+fi
+echo ""
+
+# ------------------------------------------------
+# Tests des fonctionnalités avancées (index, codec, allocation, ...)
+# Elles partagent une configuration de test créée ici et supprimée à la fin
+# ------------------------------------------------
+curl -s -c /tmp/cookies.txt -X POST "${SESSION_API}?action=login" \
+  -H "Content-Type: application/json" \
+  -d '{"username":"admin","password":"admin123"}' > /dev/null
+
+# 10.201.0.0/16 divisé en deux /17 (division "3.1" = bits 100), VLAN 201 sur la deuxième moitié
+response=$(curl -s -b /tmp/cookies.txt -X POST "${API}?action=save" \
+  -H "Content-Type: application/json" \
+  -d '{
+    "siteName": "Test Index",
+    "adminNumber": "IDX-001",
+    "networkAddress": "10.201.0.0/16",
+    "maskBits": 16,
+    "divisionData": "3.1",
+    "vlanIds": "10.201.128.0/17:201;",
+    "vlanNames": "10.201.0.0/17:Serveurs;"
+  }')
+index_id=$(echo "$response" | grep -o '"id":[0-9]*' | cut -d':' -f2)
+
+# Test 14: Recherche IP servie par l'index subnet_entries
+echo "Test 14: Recherche IP dans l'index des sous-réseaux"
+echo "-------------------------------------------"
+response=$(curl -s "${API}?action=searchIP&ip=10.201.200.1")
+leaf_only=$(curl -s "${API}?action=searchIP&ip=10.201.200.1&leafOnly=1")
+if [ -n "$index_id" ] \
+  && echo "$response" | grep -qF '"subnet":"10.201.0.0\/16"' \
+  && echo "$leaf_only" | grep -qE '"subnet":"10\.201\.128\.0\\/17","vlanId":"?201' \
+  && ! echo "$leaf_only" | grep -qF '10.201.0.0\/16'; then
+  echo -e "${GREEN}✓ PASS${NC} - Réseau parent et sous-réseau feuille (VLAN 201) trouvés"
+else
+  echo -e "${RED}✗ FAIL${NC} - Sous-réseaux attendus absents de la recherche"
+  echo "$leaf_only"
+fi
+echo ""
+
+# Test 15: Le cache du trie suit les modifications (version de données)
+echo "Test 15: Recherche IP après modification d'un VLAN"
+echo "-------------------------------------------"
+if [ -n "$index_id" ]; then
+  curl -s -b /tmp/cookies.txt -X POST "${API}?action=save" \
+    -H "Content-Type: application/json" \
+    -d "{
+      \"siteName\": \"Test Index\",
+      \"adminNumber\": \"IDX-001\",
+      \"networkAddress\": \"10.201.0.0/16\",
+      \"maskBits\": 16,
+      \"divisionData\": \"3.1\",
+      \"vlanIds\": \"10.201.128.0/17:202;\",
+      \"vlanNames\": \"10.201.0.0/17:Serveurs;\",
+      \"configId\": $index_id
+    }" > /dev/null
+fi
+response=$(curl -s "${API}?action=searchIP&ip=10.201.200.1&leafOnly=1")
+if echo "$response" | grep -qE '"vlanId":"?202' && ! echo "$response" | grep -qE '"vlanId":"?201'; then
+  echo -e "${GREEN}✓ PASS${NC} - La recherche reflète immédiatement le nouveau VLAN"
+else
+  echo -e "${RED}✗ FAIL${NC} - Résultat périmé servi par le cache"
+  echo "$response"
+fi
+echo ""
+
+# Test 16: Conflits d'adressage entre sites (balayage paginé)
+echo "Test 16: Rapport de conflits entre sites"
+echo "-------------------------------------------"
+response=$(curl -s -b /tmp/cookies.txt -X POST "${API}?action=save" \
+  -H "Content-Type: application/json" \
+  -d '{
+    "siteName": "Test Conflit",
+    "adminNumber": "CONF-001",
+    "networkAddress": "10.201.128.0/20",
+    "maskBits": 20,
+    "divisionData": "1.0",
+    "vlanIds": "",
+    "vlanNames": ""
+  }')
+conflict_id=$(echo "$response" | grep -o '"id":[0-9]*' | cut -d':' -f2)
+response=$(curl -s "${API}?action=conflicts&site=Test%20Conflit&pageSize=1")
+cursor=$(echo "$response" | grep -o '"nextCursor":"[^"]*"' | cut -d'"' -f4)
+next_page=$(curl -s "${API}?action=conflicts&site=Test%20Conflit&pageSize=1&cursor=${cursor}")
+if [ -n "$conflict_id" ] \
+  && echo "$response" | grep -qF '"type":"network"' \
+  && echo "$response" | grep -qF '"subnet":"10.201.0.0\/16"' \
+  && echo "$response" | grep -qF '"subnet":"10.201.128.0\/20"' \
+  && [ -n "$cursor" ] && echo "$next_page" | grep -q '"success":true' \
+  && echo "$next_page" | grep -qF '"type":"subnet"' \
+  && ! echo "$next_page" | grep -qF '"type":"network"'; then
+  echo -e "${GREEN}✓ PASS${NC} - Chevauchement entre sites détecté, page suivante sans doublon"
+else
+  echo -e "${RED}✗ FAIL${NC} - Conflit entre sites non signalé ou pagination incorrecte"
+  echo "$response"
+fi
+echo ""
+
+# Test 17: Pagination par curseur, y compris pour la recherche plein texte classée
+echo "Test 17: Pagination de la liste et de la recherche texte"
+echo "-------------------------------------------"
+page_ok=true
+for query in "sort=site" "search=Test"; do
+  response=$(curl -s -b /tmp/cookies.txt "${API}?action=list&limit=1&${query}")
+  cursor=$(echo "$response" | grep -o '"nextCursor":"[^"]*"' | cut -d'"' -f4)
+  next_page=$(curl -s -b /tmp/cookies.txt "${API}?action=list&limit=1&${query}&cursor=${cursor}")
+  first=$(echo "$response" | grep -o '"id":[0-9]*' | head -1)
+  second=$(echo "$next_page" | grep -o '"id":[0-9]*' | head -1)
+  if [ -z "$cursor" ] || [ -z "$second" ] || [ "$first" = "$second" ]; then
+    page_ok=false
+    echo "$query: $response"
+  fi
+done
+if $page_ok; then
+  echo -e "${GREEN}✓ PASS${NC} - Page suivante distincte fournie avec nextCursor"
 else
-  echo -e "${RED}✗ FAIL${NC} - Images GIF non accessibles: HTTP $response"
+  echo -e "${RED}✗ FAIL${NC} - Curseur absent ou page répétée"
 fi
 echo ""
 
+# Test 18: Codec de division, chaînes produites par l'encodeur JavaScript de subnets.html
+echo "Test 18: Décodage des divisions v2 (RLE, compacte) et anciennes"
+echo "-------------------------------------------"
+# Deux /28 en tête de 10.202.0.0/16 : l'encodeur PHP doit produire la chaîne RLE du navigateur
+response=$(curl -s -b /tmp/cookies.txt -X POST "${API}?action=import" \
+  -H "Content-Type: application/json" \
+  -d '[{"siteName": "Test Codec", "adminNumber": "COD-001", "networkAddress": "10.202.0.0/16",
+        "subnets": ["10.202.0.0/28", "10.202.0.16/28"]}]')
+codec_id=$(echo "$response" | grep -o '"id":[0-9]*' | head -1 | cut -d':' -f2)
+codec_ok=true
+if [ -z "$codec_id" ] \
+  || ! curl -s "${API}?action=load&id=${codec_id}" | grep -qF '"division_data":"v2~AQw"' \
+  || ! curl -s "${API}?action=searchIP&ip=10.202.0.20&leafOnly=1" | grep -qF '"subnet":"10.202.0.16\/28"'; then
+  codec_ok=false
+  echo "RLE: $response"
+fi
+# Même arbre (10.202.96.0/19 feuille) en v2 compacte puis dans l'ancien format "longueur.hex"
+for division in "v2~ANI" "9.b40"; do
+  curl -s -b /tmp/cookies.txt -X POST "${API}?action=save" \
+    -H "Content-Type: application/json" \
+    -d "{
+      \"siteName\": \"Test Codec\",
+      \"adminNumber\": \"COD-001\",
+      \"networkAddress\": \"10.202.0.0/16\",
+      \"maskBits\": 16,
+      \"divisionData\": \"$division\",
+      \"configId\": ${codec_id:-0}
+    }" > /dev/null
+  if ! curl -s "${API}?action=searchIP&ip=10.202.100.1&leafOnly=1" | grep -qF '"subnet":"10.202.96.0\/19"'; then
+    codec_ok=false
+    echo "$division: feuille 10.202.96.0/19 absente"
+  fi
+done
+# Quelques octets de longueurs RLE annonçant 2^34 nœuds : refusés sans être développés
+response=$(curl -s -b /tmp/cookies.txt -X POST "${API}?action=save" \
+  -H "Content-Type: application/json" \
+  -d '{
+    "siteName": "Test Codec",
+    "adminNumber": "COD-002",
+    "networkAddress": "10.203.0.0/16",
+    "maskBits": 16,
+    "divisionData": "v2~AYCAgIBA"
+  }')
+if ! echo "$response" | grep -q "Invalid divisionData"; then
+  codec_ok=false
+  echo "Bombe RLE acceptée: $response"
+fi
+# 2^24 - 1 nœuds tiennent sous un /8 mais dépassent la limite fixe de l'arbre
+for action in save plan; do
+  response=$(curl -s -b /tmp/cookies.txt -X POST "${API}?action=${action}" \
+    -H "Content-Type: application/json" \
+    -d '{
+      "siteName": "Test Codec",
+      "adminNumber": "COD-003",
+      "networkAddress": "10.0.0.0/8",
+      "maskBits": 8,
+      "divisionData": "v2~Af___wc",
+      "segments": [{"name": "LAN", "hosts": 10}]
+    }')
+  if ! echo "$response" | grep -q "Invalid divisionData"; then
+    codec_ok=false
+    echo "Bombe RLE acceptée sur un /8 par $action: $response"
+  fi
+done
+response=$(curl -s -b /tmp/cookies.txt -X POST "${API}?action=import" \
+  -H "Content-Type: application/json" \
+  -d '[{"siteName": "Test Codec", "adminNumber": "COD-003", "networkAddress": "10.0.0.0/8", "divisionData": "v2~Af___wc"}]')
+if ! echo "$response" | grep -q "Invalid divisionData"; then
+  codec_ok=false
+  echo "Bombe RLE acceptée sur un /8 par import: $response"
+fi
+if $codec_ok; then
+  echo -e "${GREEN}✓ PASS${NC} - Chaînes du navigateur décodées à l'identique, RLE démesurée refusée"
+else
+  echo -e "${RED}✗ FAIL${NC} - Divergence entre l'encodeur JavaScript et le décodeur PHP"
+fi
+echo ""
+
+# Test 19: Import d'une liste de sous-réseaux qui se chevauchent
+echo "Test 19: Import refusé pour des sous-réseaux chevauchants"
+echo "-------------------------------------------"
+response=$(curl -s -b /tmp/cookies.txt -X POST "${API}?action=import" \
+  -H "Content-Type: application/json" \
+  -d '[{"siteName": "Test Chevauchement", "adminNumber": "CHV-001", "networkAddress": "10.204.0.0/16",
+        "subnets": ["10.204.0.0/24", "10.204.0.128/25"]}]')
+search=$(curl -s "${API}?action=searchIP&ip=10.204.0.200")
+if echo "$response" | grep -q '"success":false' \
+  && echo "$response" | grep -q "non-overlapping" \
+  && ! echo "$search" | grep -q "Test Chevauchement"; then
+  echo -e "${GREEN}✓ PASS${NC} - Import rejeté, rien n'a été enregistré"
+else
+  echo -e "${RED}✗ FAIL${NC} - Sous-réseaux chevauchants acceptés"
+  echo "$response"
+fi
+echo ""
+
+# Test 20: Allocation (fusion des blocs libres, exclusivité sous concurrence, épuisement)
+echo "Test 20: Allocation de sous-réseaux concurrente"
+echo "-------------------------------------------"
+# 10.205.0.0/24 divisé en quatre /26 libres (division "7.31" = bits 1100100)
+response=$(curl -s -b /tmp/cookies.txt -X POST "${API}?action=save" \
+  -H "Content-Type: application/json" \
+  -d '{
+    "siteName": "Test Allocation",
+    "adminNumber": "ALLOC-001",
+    "networkAddress": "10.205.0.0/24",
+    "maskBits": 24,
+    "divisionData": "7.31",
+    "vlanIds": "",
+    "vlanNames": ""
+  }')
+alloc_id=$(echo "$response" | grep -o '"id":[0-9]*' | cut -d':' -f2)
+alloc_ok=true
+# Deux /26 libres voisins forment un /25
+response=$(curl -s -b /tmp/cookies.txt -X POST "${API}?action=allocate" \
+  -H "Content-Type: application/json" \
+  -d "{\"configId\": ${alloc_id:-0}, \"prefixLength\": 25}")
+if ! echo "$response" | grep -qF '"subnet":"10.205.0.0\/25"'; then
+  alloc_ok=false
+  echo "Fusion: $response"
+fi
+response=$(curl -s -b /tmp/cookies.txt -X POST "${API}?action=allocate" \
+  -H "Content-Type: application/json" \
+  -d "{\"configId\": ${alloc_id:-0}, \"prefixLength\": 27, \"count\": 2, \"vlanId\": \"205\"}")
+if ! echo "$response" | grep -q '"success":false'; then
+  alloc_ok=false
+  echo "VLAN sur plusieurs blocs: $response"
+fi
+# Trois demandes simultanées pour les deux /26 restants : deux réussissent, sans doublon
+for i in 1 2 3; do
+  curl -s -b /tmp/cookies.txt -X POST "${API}?action=allocate" \
+    -H "Content-Type: application/json" \
+    -d "{\"configId\": ${alloc_id:-0}, \"prefixLength\": 26}" > /tmp/allocate_$i.txt &
+done
+wait
+allocated=$(cat /tmp/allocate_1.txt /tmp/allocate_2.txt /tmp/allocate_3.txt | grep -o '"subnet":"[^"]*"' | sort)
+if [ "$(echo "$allocated" | grep -c subnet)" != "2" ] \
+  || [ "$(echo "$allocated" | uniq | grep -c subnet)" != "2" ] \
+  || [ "$(cat /tmp/allocate_1.txt /tmp/allocate_2.txt /tmp/allocate_3.txt | grep -c 'Only 0 free')" != "1" ]; then
+  alloc_ok=false
+  cat /tmp/allocate_1.txt /tmp/allocate_2.txt /tmp/allocate_3.txt
+fi
+rm -f /tmp/allocate_1.txt /tmp/allocate_2.txt /tmp/allocate_3.txt
+if $alloc_ok; then
+  echo -e "${GREEN}✓ PASS${NC} - /25 obtenu par fusion, blocs distincts sous concurrence, épuisement signalé"
+else
+  echo -e "${RED}✗ FAIL${NC} - Allocation incorrecte"
+fi
+echo ""
+
+# Test 21: Adresses d'hôtes (réseau/broadcast réservés, adresse libre suivante, redécoupage)
+echo "Test 21: Attribution et libération d'adresses d'hôtes"
+echo "-------------------------------------------"
+response=$(curl -s -b /tmp/cookies.txt -X POST "${API}?action=save" \
+  -H "Content-Type: application/json" \
+  -d '{
+    "siteName": "Test Hotes",
+    "adminNumber": "HOST-001",
+    "networkAddress": "10.206.0.0/24",
+    "maskBits": 24,
+    "divisionData": "1.0",
+    "vlanIds": "",
+    "vlanNames": ""
+  }')
+host_id=$(echo "$response" | grep -o '"id":[0-9]*' | cut -d':' -f2)
+host_ok=true
+assign_host() {
+  curl -s -b /tmp/cookies.txt -X POST "${API}?action=assignHost" \
+    -H "Content-Type: application/json" \
+    -d "{\"configId\": ${host_id:-0}, \"hostname\": \"$1\", $2}"
+}
+for ip in 10.206.0.0 10.206.0.255; do
+  if ! assign_host "reserve" "\"ip\": \"$ip\"" | grep -q "network or broadcast"; then
+    host_ok=false
+    echo "$ip attribuée"
+  fi
+done
+assign_host "srv-1" '"subnet": "10.206.0.0/24"' | grep -qF '"ip":"10.206.0.1"' || { host_ok=false; echo "nextFree != .1"; }
+assign_host "srv-2" '"ip": "10.206.0.2"' | grep -q '"success":true' || host_ok=false
+assign_host "srv-128" '"ip": "10.206.0.128"' | grep -q '"success":true' || host_ok=false
+curl -s -b /tmp/cookies.txt -X DELETE "${API}?action=releaseHost" \
+  -H "Content-Type: application/json" \
+  -d "{\"configId\": ${host_id:-0}, \"ip\": \"10.206.0.1\"}" | grep -q '"success":true' || host_ok=false
+response=$(curl -s -b /tmp/cookies.txt "${API}?action=hosts&configId=${host_id}&subnet=10.206.0.0/24")
+if ! echo "$response" | grep -qF '"assigned":2' || ! echo "$response" | grep -qF '"nextFree":"10.206.0.1"'; then
+  host_ok=false
+  echo "Après libération: $response"
+fi
+# Découpage en deux /25 : 10.206.0.128 deviendrait l'adresse réseau du second, le découpage est refusé
+split_hosts() {
+  curl -s -b /tmp/cookies.txt -X POST "${API}?action=save" \
+    -H "Content-Type: application/json" \
+    -d "{
+      \"siteName\": \"Test Hotes\",
+      \"adminNumber\": \"HOST-001\",
+      \"networkAddress\": \"10.206.0.0/24\",
+      \"maskBits\": 24,
+      \"divisionData\": \"3.1\",
+      \"configId\": ${host_id:-0}
+    }"
+}
+response=$(split_hosts)
+if ! echo "$response" | grep -q '"success":false' || ! echo "$response" | grep -qF '"ip":"10.206.0.128"'; then
+  host_ok=false
+  echo "Découpage accepté malgré l'hôte 10.206.0.128: $response"
+fi
+response=$(curl -s -b /tmp/cookies.txt "${API}?action=hosts&configId=${host_id}&subnet=10.206.0.0/24")
+echo "$response" | grep -qF '"assigned":2' || { host_ok=false; echo "Hôtes perdus après refus: $response"; }
+# Le /24 porte des hôtes : l'allocation ne peut ni le donner ni le découper
+response=$(curl -s -b /tmp/cookies.txt -X POST "${API}?action=allocate" \
+  -H "Content-Type: application/json" \
+  -d "{\"configId\": ${host_id:-0}, \"prefixLength\": 25}")
+echo "$response" | grep -q '"success":false' || { host_ok=false; echo "Allocation dans un sous-réseau occupé: $response"; }
+# Une fois 10.206.0.128 libérée, le découpage passe et les compteurs suivent
+curl -s -b /tmp/cookies.txt -X DELETE "${API}?action=releaseHost" \
+  -H "Content-Type: application/json" \
+  -d "{\"configId\": ${host_id:-0}, \"ip\": \"10.206.0.128\"}" | grep -q '"success":true' || host_ok=false
+split_hosts | grep -q '"success":true' || host_ok=false
+low=$(curl -s -b /tmp/cookies.txt "${API}?action=hosts&configId=${host_id}&subnet=10.206.0.0/25")
+high=$(curl -s -b /tmp/cookies.txt "${API}?action=hosts&configId=${host_id}&subnet=10.206.0.128/25")
+if ! echo "$low" | grep -qF '"assigned":1' || ! echo "$low" | grep -qF '"usable":126' \
+  || ! echo "$high" | grep -qF '"assigned":0' || ! echo "$high" | grep -qF '"nextFree":"10.206.0.129"'; then
+  host_ok=false
+  echo "Après découpage: $low $high"
+fi
+if $host_ok; then
+  echo -e "${GREEN}✓ PASS${NC} - Adresses réservées refusées, découpage orphelin refusé, compteurs cohérents après découpage"
+else
+  echo -e "${RED}✗ FAIL${NC} - Registre d'hôtes incohérent"
+fi
+echo ""
+
+# Test 22: Synchronisation incrémentale (curseur de version, suppressions paginées avec les mises à jour)
+echo "Test 22: Flux de modifications et suppressions"
+echo "-------------------------------------------"
+cursor=""
+while :; do
+  response=$(curl -s -b /tmp/cookies.txt "${API}?action=changes&limit=1000${cursor:+&since=$cursor}")
+  cursor=$(echo "$response" | grep -o '"cursor":"[^"]*"' | cut -d'"' -f4)
+  if [ -z "$cursor" ] || ! echo "$response" | grep -q '"hasMore":true'; then
+    break
+  fi
+done
+sync_ids=""
+for n in 0 1; do
+  response=$(curl -s -b /tmp/cookies.txt -X POST "${API}?action=save" \
+    -H "Content-Type: application/json" \
+    -d "{
+      \"siteName\": \"Test Sync\",
+      \"adminNumber\": \"SYNC-00$n\",
+      \"networkAddress\": \"10.207.$n.0/24\",
+      \"maskBits\": 24,
+      \"divisionData\": \"1.0\"
+    }")
+  sync_ids="$sync_ids $(echo "$response" | grep -o '"id":[0-9]*' | cut -d':' -f2)"
+done
+set -- $sync_ids
+deleted_id=$1
+sync_id=$2
+curl -s -b /tmp/cookies.txt -X DELETE "${API}?action=delete" \
+  -H "Content-Type: application/json" \
+  -d "{\"id\": ${deleted_id:-0}}" > /dev/null
+# Une modification par page : SYNC-001, puis la suppression de SYNC-000
+page1=$(curl -s -b /tmp/cookies.txt "${API}?action=changes&limit=1&since=${cursor}")
+next=$(echo "$page1" | grep -o '"cursor":"[^"]*"' | cut -d'"' -f4)
+page2=$(curl -s -b /tmp/cookies.txt "${API}?action=changes&limit=1&since=${next}")
+if [ -n "$cursor" ] && [ -n "$sync_id" ] \
+  && echo "$page1" | grep -q '"SYNC-001"' && echo "$page1" | grep -qF '"deleted":[]' \
+  && echo "$page1" | grep -q '"hasMore":true' \
+  && echo "$page2" | grep -qF "\"deleted\":[$deleted_id]" && echo "$page2" | grep -qF '"configurations":[]' \
+  && echo "$page2" | grep -q '"hasMore":false'; then
+  echo -e "${GREEN}✓ PASS${NC} - Modification puis suppression reçues dans l'ordre, une par page"
+else
+  echo -e "${RED}✗ FAIL${NC} - Flux de modifications incorrect"
+  echo "$page1"
+  echo "$page2"
+fi
+echo ""
+
+# Nettoyage des configurations de test
+for id in $index_id $conflict_id $codec_id $alloc_id $host_id $sync_id; do
+  curl -s -b /tmp/cookies.txt -X DELETE "${API}?action=delete" \
+    -H "Content-Type: application/json" \
+    -d "{\"id\": $id}" > /dev/null
+done
+curl -s -b /tmp/cookies.txt -X POST "${SESSION_API}?action=logout" > /dev/null
+
 # Nettoyage
 rm -f /tmp/cookies.txt
 
@@ -0,0 +1,50 @@
+#!/usr/bin/env php
+<?php
+/**
+ * Sessions loaded read-only must still count as active for the garbage
+ * collector: a user whose requests are spread over more than the GC
+ * lifetime, but never further apart than it, stays logged in.
+ *
+ * Usage: php tests/test_session_store.php
+ * Runs locally with the files handler, without server or database.
+ */
+
+require_once __DIR__ . '/../session_store.php';
+
+$savePath = sys_get_temp_dir() . '/subnets-session-test-' . getmypid();
+mkdir($savePath, 0700);
+ini_set('session.save_path', $savePath);
+ini_set('session.use_strict_mode', '0');
+ini_set('session.gc_maxlifetime', '4');
+// Collect garbage on every session start
+ini_set('session.gc_probability', '1');
+ini_set('session.gc_divisor', '1');
+putenv('SESSION_HANDLER=files');
+
+// Login. Nothing is printed before the last session start, which needs unsent headers.
+session_id('sessiontest' . getmypid());
+SessionStore::start();
+SessionStore::open();
+$_SESSION['user_id'] = 1;
+SessionStore::commit();
+
+// Five requests three seconds apart: 15 s in all, almost four times the lifetime
+$requests = 0;
+do {
+    sleep(3);
+    $_SESSION = [];
+    SessionStore::start();
+    $alive = ($_SESSION['user_id'] ?? null) === 1;
+} while ($alive && ++$requests < 5);
+
+array_map('unlink', glob($savePath . '/sess_*') ?: []);
+rmdir($savePath);
+
+echo "Test: Session active au-delà de session.gc_maxlifetime\n";
+echo "-------------------------------------------\n";
+if ($alive) {
+    echo "\033[0;32m✓ PASS\033[0m - Session conservée après 5 requêtes espacées de 3 s (durée de vie 4 s)\n";
+    exit(0);
+}
+echo "\033[0;31m✗ FAIL\033[0m - Session supprimée par le GC après " . ($requests + 1) . " requête(s)\n";
+exit(1);